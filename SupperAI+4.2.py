@@ -1,20 +1,410 @@
 import sys
 import os
 import json
+import math
+import argparse
 import time
+import heapq
+import hashlib
+import queue
+import sqlite3
+import threading
+import uuid
 import pyautogui
 import pyperclip
+from collections import deque, OrderedDict
 from functools import partial
+from itertools import islice
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QMainWindow, QHBoxLayout,
     QVBoxLayout, QTextEdit, QPushButton, QLabel,
     QAction, QToolBar, QComboBox, QMenu, QSizePolicy,
     QMessageBox, QTabWidget, QListWidget,
-    QListWidgetItem, QSplitter, QDialog, QTabBar, QFrame, QDockWidget, QShortcut, QInputDialog, QActionGroup, QLineEdit, QToolButton, QTableWidget, QTableWidgetItem, QTreeWidget, QTreeWidgetItem,QAbstractItemView
+    QListWidgetItem, QListView, QSplitter, QDialog, QTabBar, QFrame, QDockWidget, QShortcut, QInputDialog, QActionGroup, QLineEdit, QToolButton, QTableWidget, QTableWidgetItem, QTreeWidget, QTreeWidgetItem,QAbstractItemView
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile, QWebEnginePage, QWebEngineSettings
-from PyQt5.QtCore import Qt, QUrl, QStandardPaths, QTimer, QSize, QRect, QPoint
-from PyQt5.QtGui import QIcon, QColor, QPalette, QKeySequence, QCursor, QScreen, QTextCharFormat, QFont, QFontMetrics
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile, QWebEnginePage, QWebEngineSettings, QWebEngineScript
+from PyQt5.QtCore import (
+    Qt, QUrl, QStandardPaths, QTimer, QSize, QRect, QPoint, QObject, QFile, QIODevice, pyqtSignal, pyqtSlot,
+    QAbstractListModel, QModelIndex, QThreadPool, QRunnable, QProcess
+)
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+from PyQt5.QtGui import QWindow, QIcon, QColor, QPalette, QKeySequence, QCursor, QScreen, QTextCharFormat, QTextCursor, QFont, QFontMetrics
+
+try:
+    # 可选依赖：安装后搜索框支持用拼音检索中文提示词
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+try:
+    # 可选依赖：用于统计浏览器进程的实际内存占用
+    import psutil
+except ImportError:
+    psutil = None
+
+class AsyncLogWriter:
+    # 后台日志写入：界面线程只把日志放入有界队列，由后台线程批量写盘并按大小和日期轮转。
+    # 队列满时丢弃并计数，界面线程永远不会因磁盘阻塞
+    def __init__(self, max_queue=10000, max_bytes=5 * 1024 * 1024, backup_count=5, batch_size=500):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.thread = None
+        self.files = {}  # path -> [文件对象, 打开时的日期]
+        self.start_lock = threading.Lock()
+
+    def write(self, path, text):
+        self.ensure_started()
+        try:
+            self.queue.put_nowait((path, text))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=2.0):
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self.queue.put(('__flush__', done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self.thread is None:
+            return
+        self.flush(timeout)
+        try:
+            self.queue.put(('__stop__', None), timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+        if self.dropped:
+            print(f"日志队列已满，丢弃 {self.dropped} 条日志")
+
+    def ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='SupperAI-log-writer', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            # 把队列中已有的日志一次取出，合并写入
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = {}
+            stop = False
+            flush_events = []
+            for path, payload in batch:
+                if path == '__flush__':
+                    flush_events.append(payload)
+                elif path == '__stop__':
+                    stop = True
+                else:
+                    pending.setdefault(path, []).append(payload)
+            for path, texts in pending.items():
+                try:
+                    self.write_batch(path, ''.join(texts))
+                except Exception as e:
+                    # 任何异常都不能结束写入线程；丢掉可能已失效的文件对象，下一批重新打开
+                    print(f"写入日志 {path} 失败：{e}")
+                    entry = self.files.pop(path, None)
+                    if entry is not None:
+                        try:
+                            entry[0].close()
+                        except Exception:
+                            pass
+            for event in flush_events:
+                event.set()
+            if stop:
+                for f, _ in self.files.values():
+                    f.close()
+                self.files.clear()
+                return
+
+    def write_batch(self, path, data):
+        today = time.strftime('%Y-%m-%d')
+        entry = self.files.get(path)
+        if entry is None:
+            # 启动时日志文件若是之前某天写的，先按日期归档
+            if os.path.exists(path):
+                file_date = time.strftime('%Y-%m-%d', time.localtime(os.path.getmtime(path)))
+                if file_date != today:
+                    self.try_rotate(self.rotate_by_date, path, file_date)
+            entry = self.files[path] = [open(path, 'a', encoding='utf-8'), today]
+        elif entry[1] != today:
+            entry[0].close()
+            self.try_rotate(self.rotate_by_date, path, entry[1])
+            entry = self.files[path] = [open(path, 'a', encoding='utf-8'), today]
+        f = entry[0]
+        if f.tell() > 0 and f.tell() + len(data.encode('utf-8')) > self.max_bytes:
+            f.close()
+            self.try_rotate(self.rotate_by_size, path)
+            entry[0] = f = open(path, 'a', encoding='utf-8')
+        f.write(data)
+        f.flush()
+
+    def try_rotate(self, rotate, path, *args):
+        # 文件被其他进程占用（如 Windows 上编辑器打开着日志）时轮转会失败：继续追加到原文件，下次再试
+        try:
+            rotate(path, *args)
+        except OSError as e:
+            print(f"日志 {path} 轮转失败：{e}")
+
+    def rotate_by_date(self, path, date):
+        base, ext = os.path.splitext(path)
+        target = f"{base}.{date}{ext}"
+        index = 1
+        while os.path.exists(target):
+            target = f"{base}.{date}.{index}{ext}"
+            index += 1
+        os.replace(path, target)
+
+    def rotate_by_size(self, path):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+
+LOG_WRITER = AsyncLogWriter()
+
+
+class Profiler:
+    # 性能剖析：用 --profile [文件] 参数或 SUPPERAI_PROFILE 环境变量开启，记录启动和发送链路上
+    # 各阶段的耗时，退出时写成 Chrome trace 格式的 JSON（可在 chrome://tracing 或 Perfetto 中打开），
+    # 其中 otherData 附带各阶段的汇总，便于不同版本之间对比
+    DEFAULT_PATH = 'supperai_trace.json'
+    # 超过阈值（毫秒）的阶段会在控制台提示，并记入报告的 slow 列表
+    SLOW_THRESHOLDS_MS = {
+        'config_load': 100,
+        'history_load': 300,
+        'ai_platform_init': 300,
+        'page_load': 8000,
+        'js_injection': 500,
+        'send_confirmation': 3000,
+        'first_token': 15000,
+    }
+
+    def __init__(self):
+        self.enabled = False
+        self.path = self.DEFAULT_PATH
+        self.origin = time.perf_counter()
+        self.events = []
+        self.open_spans = {}  # key -> (名称, 开始时间, 参数)
+        self.stats = {}  # 名称 -> [次数, 总耗时, 最大耗时]
+        self.slow = []
+        self.async_ids = 0
+
+    def configure(self, argv, environ):
+        value = environ.get('SUPPERAI_PROFILE')
+        if value:
+            self.enabled = True
+            if value not in ('1', 'true', 'yes'):
+                self.path = value
+        if '--profile' in argv:
+            self.enabled = True
+            index = argv.index('--profile')
+            if index + 1 < len(argv) and not argv[index + 1].startswith('-'):
+                self.path = argv[index + 1]
+        if self.enabled:
+            print(f"性能剖析已开启，退出时写入 {self.path}")
+
+    def now_us(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def span(self, name, **args):
+        # 同步阶段：with PROFILER.span('config_load'): ...
+        if not self.enabled:
+            return _NULL_SPAN
+        return _ProfileSpan(self, name, args)
+
+    def begin(self, key, name, **args):
+        # 跨回调的异步阶段，由 begin/end 按 key 配对
+        if self.enabled:
+            self.open_spans[key] = (name, self.now_us(), args)
+
+    def end(self, key, **args):
+        if not self.enabled:
+            return
+        span = self.open_spans.pop(key, None)
+        if span is None:
+            return
+        name, start, begin_args = span
+        begin_args.update(args)
+        self.async_ids += 1
+        end = self.now_us()
+        common = {'name': name, 'cat': name, 'pid': os.getpid(), 'tid': 0, 'id': self.async_ids}
+        self.events.append(dict(common, ph='b', ts=start, args=begin_args))
+        self.events.append(dict(common, ph='e', ts=end))
+        self.record(name, start, end, begin_args)
+
+    def complete(self, name, start, end, args):
+        self.events.append({'name': name, 'cat': name, 'ph': 'X', 'ts': start, 'dur': end - start,
+                            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+        self.record(name, start, end, args)
+
+    def instant(self, name, **args):
+        if self.enabled:
+            self.events.append({'name': name, 'cat': 'mark', 'ph': 'i', 's': 'g', 'ts': self.now_us(),
+                                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+    def record(self, name, start, end, args):
+        duration_ms = (end - start) / 1000
+        stat = self.stats.setdefault(name, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += duration_ms
+        stat[2] = max(stat[2], duration_ms)
+        threshold = self.SLOW_THRESHOLDS_MS.get(name)
+        if threshold is not None and duration_ms > threshold:
+            self.slow.append({'name': name, 'ms': round(duration_ms, 1), 'args': args})
+            print(f"[profile] {name} 用时 {duration_ms:.0f} 毫秒，超过 {threshold} 毫秒 {args}")
+
+    def summary(self):
+        return {name: {'count': count, 'total_ms': round(total, 1), 'avg_ms': round(total / count, 1),
+                       'max_ms': round(longest, 1)}
+                for name, (count, total, longest) in self.stats.items()}
+
+    def write(self):
+        if not self.enabled:
+            return
+        report = {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'version': 'SupperAI+ 4.2',
+                'written_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'summary': self.summary(),
+                'slow': self.slow,
+            },
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class _ProfileSpan:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.profiler.now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.complete(self.name, self.start, self.profiler.now_us(), self.args)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+PROFILER = Profiler()
+
+
+class ConfigStore(QObject):
+    # config.json 的读写：修改后只标记为脏，短时间内的多次修改合并为一次写入；写入先写临时文件再原子替换，
+    # 中途崩溃不会留下半个文件。文件带 schema_version，旧版本读入时按顺序迁移
+    SCHEMA_VERSION = 2
+    DEBOUNCE_MS = 500
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.data = None
+        self.dirty = False
+        self.last_written = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DEBOUNCE_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def load(self, defaults):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except ValueError as e:
+                # 文件损坏：保留原文件以便排查，使用默认配置
+                print(f"配置文件 {self.path} 无法解析（{e}），已改名为 {self.path}.corrupt 并使用默认配置")
+                os.replace(self.path, self.path + '.corrupt')
+                self.data = None
+        if self.data is None:
+            self.data = defaults
+            self.data['schema_version'] = self.SCHEMA_VERSION
+            self.write()
+        elif self.migrate(self.data):
+            self.write()
+        else:
+            # 与磁盘内容相同的配置不再重复写入
+            self.last_written = json.dumps(self.data, indent=4, ensure_ascii=False)
+        return self.data
+
+    def migrate(self, data):
+        version = data.get('schema_version', 1)
+        if version >= self.SCHEMA_VERSION:
+            return False
+        while version < self.SCHEMA_VERSION:
+            getattr(self, f'migrate_{version}_to_{version + 1}')(data)
+            version += 1
+        data['schema_version'] = version
+        print(f"配置文件已升级到第 {version} 版")
+        return True
+
+    def migrate_1_to_2(self, data):
+        # 第 1 版没有版本号，部分字段可能缺失
+        data.setdefault('ai_platforms', [])
+        data.setdefault('common_urls', {})
+        data.setdefault('platform_coordinates', {})
+        data.setdefault('num_platforms', len(data['ai_platforms']))
+
+    def mark_dirty(self):
+        self.dirty = True
+        self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if self.dirty:
+            self.write()
+
+    def write(self):
+        text = json.dumps(self.data, indent=4, ensure_ascii=False)
+        self.dirty = False
+        if text == self.last_written:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.last_written = text
+        except OSError as e:
+            print(f"保存配置文件失败：{e}")
+
 
 class CoordinateSettingDialog(QDialog):
     # 保持不变
@@ -175,6 +565,10 @@ class HistoryListItem(QWidget):
 
 
 class PromptTab(QWidget):
+    POPUP_SIZE = 20  # "/" 补全最多显示的条数
+    POPUP_CLOSE_KEYS = (Qt.Key_Left, Qt.Key_Right, Qt.Key_Home, Qt.Key_End, Qt.Key_PageUp, Qt.Key_PageDown,
+                        Qt.Key_Tab)
+
     def __init__(self, prompt_manager, parent=None, title="提示词"):
         super().__init__(parent)
         self.prompt_manager = prompt_manager
@@ -234,6 +628,7 @@ class PromptTab(QWidget):
         self.text_edit.setPlaceholderText("请输入提示词...")
         self.text_edit.setAcceptRichText(True)  # 允许富文本
         self.text_edit.cursorPositionChanged.connect(self.update_formatting_buttons)
+        self.text_edit.textChanged.connect(self.on_text_changed)
 
         # 按钮布局
         button_layout = QHBoxLayout()
@@ -265,21 +660,28 @@ class PromptTab(QWidget):
         self.history_popup.itemClicked.connect(self.complete_prompt)
 
     def save_chat_history(self):
-        # 获取第一个浏览器的标题
+        # 同时向所有浏览器取标题，用第一个可用的标题
         if not self.prompt_manager.main_window.ai_platform_widgets:
             QMessageBox.warning(self, "提示", "没有AI平台可获取标题。")
             return
-        first_browser = self.prompt_manager.main_window.ai_platform_widgets[0]
-        def get_title_callback(title):
+        main_window = self.prompt_manager.main_window
+
+        def on_titles(results):
+            # 按窗口顺序取第一个拿到的标题；都没有及时返回时标题留空
+            title = next((r.value for r in results if r.state == GatherResult.OK and r.value), '')
             # 弹出对话框，允许用户修改标题
             text, ok = QInputDialog.getText(self, "保存历史对话", "请输入历史对话标题：", text=title)
             if ok and text:
                 # 获取所有浏览器的当前实际访问的网址
-                urls = [widget.browser.url().toString() for widget in self.prompt_manager.main_window.ai_platform_widgets]
+                urls = [widget.current_url() for widget in self.prompt_manager.main_window.ai_platform_widgets]
                 # 保存到历史对话
                 self.prompt_manager.add_to_chat_history(text, urls)
                 QMessageBox.information(self, "保存成功", "历史对话已保存。")
-        first_browser.browser.page().runJavaScript("document.title;", get_title_callback)
+
+        gather = ScatterGather(main_window.ai_platform_widgets, lambda w, cb: w.fetch_title(cb),
+                               timeout_ms=2000, label='fetch_titles', parent=self)
+        gather.finished.connect(on_titles)
+        gather.start()
 
     def toggle_bold(self):
         fmt = self.text_edit.currentCharFormat()
@@ -322,10 +724,23 @@ class PromptTab(QWidget):
             elif event.key() == Qt.Key_Return and self.history_popup.isVisible():
                 self.complete_prompt()
                 return True
-            else:
+            elif event.key() in (Qt.Key_Up, Qt.Key_Down) and self.history_popup.isVisible():
+                step = -1 if event.key() == Qt.Key_Up else 1
+                row = self.history_popup.currentRow() + step
+                if 0 <= row < self.history_popup.count():
+                    self.history_popup.setCurrentRow(row)
+                return True
+            elif event.key() == Qt.Key_Escape:
+                self.history_popup.hide()
+            elif event.key() in self.POPUP_CLOSE_KEYS:
+                # 移动光标的按键关闭补全；Shift、Ctrl 等修饰键和输入法切换不影响，输入字符时补全随输入更新
                 self.history_popup.hide()
         return super().eventFilter(obj, event)
 
+    def on_text_changed(self):
+        if self.history_popup.isVisible():
+            self.update_history_popup()
+
     def show_history_popup(self):
         cursor_rect = self.text_edit.cursorRect()
         global_pos = self.text_edit.mapToGlobal(cursor_rect.bottomRight())
@@ -335,11 +750,17 @@ class PromptTab(QWidget):
 
     def update_history_popup(self):
         text = self.text_edit.toPlainText()
-        filtered = [p['prompt'] for p in self.prompt_manager.history if text.lower() in p['prompt'].lower()]
-        self.history_popup.clear()
-        for prompt in filtered:
-            item = QListWidgetItem(prompt)
-            self.history_popup.addItem(item)
+        filtered = self.prompt_manager.search_prompts(text, self.POPUP_SIZE)
+        # 复用已有的条目，只增删数量差
+        for row, prompt in enumerate(filtered):
+            if row < self.history_popup.count():
+                self.history_popup.item(row).setText(prompt)
+            else:
+                self.history_popup.addItem(QListWidgetItem(prompt))
+        while self.history_popup.count() > len(filtered):
+            self.history_popup.takeItem(self.history_popup.count() - 1)
+        if filtered:
+            self.history_popup.setCurrentRow(0)
 
     def complete_prompt(self):
         item = self.history_popup.currentItem()
@@ -360,7 +781,1213 @@ class PromptTab(QWidget):
         QMessageBox.information(self, "语音输入", "语音输入功能待实现。")
 
 
+class PromptJournal:
+    # 旧版提示词记录的只读加载器，仅在 PromptStore 首次导入旧记录时使用：
+    # 追加日志每行一条 JSON（add 新增，del 删除墓碑），更早的版本是 TSV 文件
+    def __init__(self, path, legacy_path=None, legacy_newest_first=False):
+        self.path = path
+        self.legacy_path = legacy_path  # 旧版 TSV 文件，没有追加日志时读取
+        self.legacy_newest_first = legacy_newest_first
+
+    def load(self):
+        if os.path.exists(self.path):
+            return self.load_journal()
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            return self.load_legacy()
+        return []
+
+    def load_journal(self):
+        entries = {}  # id -> 记录，按写入顺序
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 忽略异常退出时写了一半的行
+                entry_id = record.get('id', 0)
+                if record.get('op') == 'del':
+                    entries.pop(entry_id, None)
+                else:
+                    entries[entry_id] = {'timestamp': record['timestamp'], 'prompt': record['prompt']}
+        return list(entries.values())
+
+    def load_legacy(self):
+        rows = []
+        with open(self.legacy_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        timestamp, prompt = line.strip().split('\t', 1)
+                        rows.append({'timestamp': timestamp, 'prompt': prompt})
+                    except ValueError:
+                        pass  # 忽略格式错误的行
+        if self.legacy_newest_first:
+            rows.reverse()
+        return rows
+
+
+class PromptStore:
+    # 提示词、收藏、历史对话和 AI 回复统一存放在一个 SQLite 数据库（WAL 模式）中，
+    # 提示词和回复建有 FTS5 全文索引；界面按页读取，启动时不再把全部记录读入内存
+    PROMPT_TABLES = ('prompts', 'favorites')
+    ORDERS = {
+        'time_desc': 'timestamp DESC, id DESC',
+        'time_asc': 'timestamp ASC, id ASC',
+        'content_asc': 'prompt COLLATE NOCASE ASC, id ASC',
+        'content_desc': 'prompt COLLATE NOCASE DESC, id DESC',
+        'id_asc': 'id ASC',
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.fts_tokenizer = self.detect_fts_tokenizer()
+        self.create_schema()
+
+    def detect_fts_tokenizer(self):
+        # trigram 分词器（SQLite 3.34+）支持中文任意子串检索，旧版本退回 unicode61
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            self.conn.execute("DROP TABLE temp.fts_probe")
+            return 'trigram'
+        except sqlite3.OperationalError:
+            return 'unicode61'
+
+    def create_schema(self):
+        tokenizer = self.fts_tokenizer
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS prompts (id INTEGER PRIMARY KEY, prompt TEXT NOT NULL, timestamp TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS prompts_timestamp ON prompts(timestamp);
+                CREATE INDEX IF NOT EXISTS prompts_prompt ON prompts(prompt COLLATE NOCASE);
+                CREATE TABLE IF NOT EXISTS favorites (id INTEGER PRIMARY KEY, prompt TEXT NOT NULL UNIQUE, timestamp TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, title TEXT NOT NULL, time TEXT NOT NULL, urls TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS sessions_time ON sessions(time);
+                CREATE TABLE IF NOT EXISTS replies (
+                    id INTEGER PRIMARY KEY, prompt TEXT NOT NULL, platform TEXT NOT NULL, content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL, ttft REAL, total_time REAL
+                );
+                CREATE INDEX IF NOT EXISTS replies_prompt ON replies(prompt);
+                CREATE TABLE IF NOT EXISTS highlights (
+                    id TEXT PRIMARY KEY, url TEXT NOT NULL, platform TEXT NOT NULL, color TEXT NOT NULL,
+                    exact TEXT NOT NULL, prefix TEXT NOT NULL, suffix TEXT NOT NULL,
+                    pos_start INTEGER NOT NULL, pos_end INTEGER NOT NULL, created TEXT NOT NULL
+                );
+                DROP INDEX IF EXISTS highlights_url;
+                CREATE INDEX IF NOT EXISTS highlights_key ON highlights(platform, url, pos_start);
+                CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(prompt, content='prompts', content_rowid='id', tokenize='{tokenizer}');
+                CREATE VIRTUAL TABLE IF NOT EXISTS favorites_fts USING fts5(prompt, content='favorites', content_rowid='id', tokenize='{tokenizer}');
+                CREATE VIRTUAL TABLE IF NOT EXISTS replies_fts USING fts5(content, content='replies', content_rowid='id', tokenize='{tokenizer}');
+            """)
+            # 外部内容 FTS 表通过触发器与主表同步
+            for table, column in (('prompts', 'prompt'), ('favorites', 'prompt'), ('replies', 'content')):
+                self.conn.executescript(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {table}_fts(rowid, {column}) VALUES (new.id, new.{column});
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {table}_fts({table}_fts, rowid, {column}) VALUES ('delete', old.id, old.{column});
+                    END;
+                """)
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)', (key, value))
+
+    def import_legacy_files(self):
+        # 一次性导入旧版文件：历史/收藏的追加日志（或更早的 TSV）以及 chat_history.log
+        if self.get_meta('legacy_imported'):
+            return
+        history = PromptJournal('prompt_history.jsonl', 'prompt_history.log', legacy_newest_first=True).load()
+        favorites = PromptJournal('prompt_favorites.jsonl', 'prompt_favorites.log').load()
+        chats = []
+        if os.path.exists('chat_history.log'):
+            try:
+                with open('chat_history.log', 'r', encoding='utf-8') as f:
+                    chats = json.load(f)
+            except ValueError:
+                chats = []
+        with self.conn:
+            self.conn.executemany('INSERT INTO prompts(prompt, timestamp) VALUES (?, ?)',
+                                  [(e['prompt'], e['timestamp']) for e in history])
+            self.conn.executemany('INSERT OR IGNORE INTO favorites(prompt, timestamp) VALUES (?, ?)',
+                                  [(e['prompt'], e['timestamp']) for e in favorites])
+            # 旧文件中历史对话从新到旧排列
+            self.conn.executemany('INSERT INTO sessions(title, time, urls) VALUES (?, ?, ?)',
+                                  [(c['title'], c['time'], json.dumps(c['urls'], ensure_ascii=False)) for c in reversed(chats)])
+            self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('legacy_imported', ?)",
+                              (time.strftime("%Y-%m-%d %H:%M:%S"),))
+        if history or favorites or chats:
+            print(f"已导入旧版记录：历史 {len(history)} 条，收藏 {len(favorites)} 条，历史对话 {len(chats)} 条")
+
+    def check_table(self, table):
+        if table not in self.PROMPT_TABLES:
+            raise ValueError(f"未知的提示词表：{table}")
+
+    def add_prompt(self, table, prompt, timestamp):
+        self.check_table(table)
+        with self.conn:
+            cursor = self.conn.execute(f'INSERT OR IGNORE INTO {table}(prompt, timestamp) VALUES (?, ?)', (prompt, timestamp))
+        if not cursor.rowcount:
+            return None
+        return {'id': cursor.lastrowid, 'timestamp': timestamp, 'prompt': prompt}
+
+    def delete_prompt(self, table, entry_id):
+        self.check_table(table)
+        with self.conn:
+            self.conn.execute(f'DELETE FROM {table} WHERE id = ?', (entry_id,))
+
+    def has_prompt(self, table, prompt):
+        self.check_table(table)
+        return self.conn.execute(f'SELECT 1 FROM {table} WHERE prompt = ? LIMIT 1', (prompt,)).fetchone() is not None
+
+    def match_clause(self, table, text):
+        # 返回 (where 子句, 参数)；trigram 需要至少 3 个字符，更短的查询用 LIKE
+        text = text.strip()
+        if not text:
+            return '', ()
+        if self.fts_tokenizer == 'trigram' and len(text) >= 3:
+            quoted = '"' + text.replace('"', '""') + '"'
+            return f'WHERE id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)', (quoted,)
+        return "WHERE prompt LIKE ? ESCAPE '\\'", (self.like_pattern(text),)
+
+    @staticmethod
+    def like_pattern(text):
+        # LIKE 子串模式：转义 % 和 _，配合 ESCAPE '\' 使用
+        escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f'%{escaped}%'
+
+    def count_prompts(self, table, text=''):
+        self.check_table(table)
+        where, params = self.match_clause(table, text)
+        return self.conn.execute(f'SELECT COUNT(*) FROM {table} {where}', params).fetchone()[0]
+
+    def set_search_results(self, name, ids):
+        # 检索结果的 id 写入临时表，结果列表再按页用 id IN 子查询读取
+        with self.conn:
+            self.conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS search_{name} (id INTEGER PRIMARY KEY)')
+            self.conn.execute(f'DELETE FROM temp.search_{name}')
+            self.conn.executemany(f'INSERT INTO temp.search_{name}(id) VALUES (?)', ((i,) for i in ids))
+
+    @staticmethod
+    def result_clause(where, result_set):
+        if not result_set:
+            return where
+        clause = f'id IN (SELECT id FROM temp.search_{result_set})'
+        return f'{where} AND {clause}' if where else f'WHERE {clause}'
+
+    def fetch_prompts(self, table, order='time_desc', text='', offset=0, limit=200, result_set=None):
+        self.check_table(table)
+        where, params = self.match_clause(table, text)
+        where = self.result_clause(where, result_set)
+        rows = self.conn.execute(
+            f'SELECT id, prompt, timestamp FROM {table} {where} ORDER BY {self.ORDERS[order]} LIMIT ? OFFSET ?',
+            params + (limit, offset))
+        return [dict(row) for row in rows]
+
+    def iter_prompts(self, table, order='time_asc', batch_size=2000):
+        offset = 0
+        while True:
+            rows = self.fetch_prompts(table, order, '', offset, batch_size)
+            if not rows:
+                return
+            yield from rows
+            offset += len(rows)
+
+    def add_session(self, title, urls, timestamp):
+        with self.conn:
+            cursor = self.conn.execute('INSERT INTO sessions(title, time, urls) VALUES (?, ?, ?)',
+                                       (title, timestamp, json.dumps(urls, ensure_ascii=False)))
+        return {'id': cursor.lastrowid, 'title': title, 'time': timestamp, 'urls': urls}
+
+    def delete_session(self, session_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def fetch_sessions(self, text='', offset=0, limit=200, result_set=None):
+        params = ()
+        where = ''
+        if text.strip():
+            where = "WHERE title LIKE ? ESCAPE '\\'"
+            params = (self.like_pattern(text.strip()),)
+        where = self.result_clause(where, result_set)
+        rows = self.conn.execute(
+            f'SELECT id, title, time, urls FROM sessions {where} ORDER BY time DESC, id DESC LIMIT ? OFFSET ?',
+            params + (limit, offset))
+        return [{'id': row['id'], 'title': row['title'], 'time': row['time'], 'urls': json.loads(row['urls'])}
+                for row in rows]
+
+    def add_reply(self, prompt, platform, content, timestamp, ttft=None, total_time=None):
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO replies(prompt, platform, content, timestamp, ttft, total_time) VALUES (?, ?, ?, ?, ?, ?)',
+                (prompt, platform, content, timestamp, ttft, total_time))
+        return cursor.lastrowid
+
+    def recent_reply_metrics(self, platform, limit=200):
+        # 某平台最近的回复耗时 (首字时间, 总时间, 字数)，从旧到新
+        rows = self.conn.execute(
+            'SELECT ttft, total_time, length(content) FROM replies WHERE platform = ? AND total_time IS NOT NULL '
+            'ORDER BY id DESC LIMIT ?', (platform, limit)).fetchall()
+        return [tuple(row) for row in reversed(rows)]
+
+    def search_replies(self, text, limit=100):
+        text = text.strip()
+        if not text:
+            return []
+        if self.fts_tokenizer == 'trigram' and len(text) >= 3:
+            rows = self.conn.execute(
+                'SELECT r.* FROM replies r JOIN replies_fts f ON f.rowid = r.id WHERE replies_fts MATCH ? '
+                'ORDER BY r.id DESC LIMIT ?', ('"' + text.replace('"', '""') + '"', limit))
+        else:
+            rows = self.conn.execute("SELECT * FROM replies WHERE content LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+                                     (self.like_pattern(text), limit))
+        return [dict(row) for row in rows]
+
+    def add_highlight(self, record):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO highlights(id, url, platform, color, exact, prefix, suffix, pos_start, pos_end, created) '
+                'VALUES (:id, :url, :platform, :color, :exact, :prefix, :suffix, :start, :end, :created)', record)
+
+    def delete_highlight(self, highlight_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM highlights WHERE id = ?', (highlight_id,))
+
+    def delete_highlights_for_url(self, platform, url):
+        with self.conn:
+            self.conn.execute('DELETE FROM highlights WHERE platform = ? AND url = ?', (platform, url))
+
+    def highlights_for_url(self, platform, url):
+        rows = self.conn.execute(
+            'SELECT id, url, platform, color, exact, prefix, suffix, pos_start AS start, pos_end AS end, created '
+            'FROM highlights WHERE platform = ? AND url = ? ORDER BY pos_start', (platform, url))
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+# 划线运行时：记录划线的 W3C TextQuoteSelector / TextPositionSelector（以 body 中文本节点的拼接文本为坐标），
+# 页面重新加载后按选择器重新定位。定位失败的划线在页面内容变化时继续尝试（单页应用的内容往往晚于 loadFinished 渲染）。
+# 支持 CSS Custom Highlight API 时用 Range 绘制划线，不修改页面 DOM；否则把范围拆成文本节点片段逐段包裹 span，
+# 跨段落、跨元素的选区都能划线。脚本随页面注入一次，之后每个操作只需一次 runJavaScript
+HIGHLIGHT_JS = """
+(function() {
+    if (window.__supperaiHL) {
+        return;
+    }
+    var CONTEXT = 32;
+    var RETRY_MS = 30000;
+    var useHighlightApi = !!(window.CSS && CSS.highlights && window.Highlight);
+    var entries = {};  // 划线 id -> {color, range}（Highlight API）或 {color, spans}
+    var registered = {};  // 颜色 -> Highlight
+    var unresolved = [];
+    var observer = null;
+    var retryTimer = null;
+    var retryUntil = 0;
+
+    function textNodes() {
+        var walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, {
+            acceptNode: function(node) {
+                var name = node.parentNode && node.parentNode.nodeName;
+                return (name === 'SCRIPT' || name === 'STYLE' || name === 'NOSCRIPT') ?
+                    NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT;
+            }
+        });
+        var nodes = [];
+        var node;
+        while ((node = walker.nextNode())) {
+            nodes.push(node);
+        }
+        return nodes;
+    }
+
+    function snapshot() {
+        var nodes = textNodes();
+        var starts = [];
+        var parts = [];
+        var pos = 0;
+        for (var i = 0; i < nodes.length; i++) {
+            starts.push(pos);
+            parts.push(nodes[i].data);
+            pos += nodes[i].data.length;
+        }
+        return {nodes: nodes, starts: starts, text: parts.join('')};
+    }
+
+    function offsetOf(snap, container, offset) {
+        if (container.nodeType === Node.TEXT_NODE) {
+            var index = snap.nodes.indexOf(container);
+            if (index !== -1) {
+                return snap.starts[index] + offset;
+            }
+        }
+        var point = document.createRange();
+        point.setStart(container, offset);
+        for (var i = 0; i < snap.nodes.length; i++) {
+            if (point.comparePoint(snap.nodes[i], 0) >= 0) {
+                return snap.starts[i];
+            }
+        }
+        return snap.text.length;
+    }
+
+    function locate(snap, offset, isEnd) {
+        // 文本偏移 -> (文本节点, 节点内偏移)，二分查找
+        var lo = 0, hi = snap.nodes.length - 1;
+        while (lo < hi) {
+            var mid = (lo + hi + 1) >> 1;
+            if (snap.starts[mid] < offset || (!isEnd && snap.starts[mid] === offset)) {
+                lo = mid;
+            } else {
+                hi = mid - 1;
+            }
+        }
+        return {node: snap.nodes[lo], offset: offset - snap.starts[lo]};
+    }
+
+    function rangeFromOffsets(snap, start, end) {
+        if (!snap.nodes.length || start >= end) {
+            return null;
+        }
+        var a = locate(snap, start, false);
+        var b = locate(snap, end, true);
+        var range = document.createRange();
+        range.setStart(a.node, a.offset);
+        range.setEnd(b.node, b.offset);
+        return range;
+    }
+
+    function selectorsFor(snap, start, end) {
+        return [
+            {type: 'TextQuoteSelector', exact: snap.text.slice(start, end),
+             prefix: snap.text.slice(Math.max(0, start - CONTEXT), start),
+             suffix: snap.text.slice(end, end + CONTEXT)},
+            {type: 'TextPositionSelector', start: start, end: end}
+        ];
+    }
+
+    function pick(selectors, type) {
+        for (var i = 0; i < selectors.length; i++) {
+            if (selectors[i].type === type) {
+                return selectors[i];
+            }
+        }
+        return null;
+    }
+
+    function commonSuffix(a, b) {
+        var n = 0;
+        while (n < a.length && n < b.length && a[a.length - 1 - n] === b[b.length - 1 - n]) {
+            n++;
+        }
+        return n;
+    }
+
+    function commonPrefix(a, b) {
+        var n = 0;
+        while (n < a.length && n < b.length && a[n] === b[n]) {
+            n++;
+        }
+        return n;
+    }
+
+    function find(snap, selectors) {
+        // 先按位置选择器直接核对，不符时在全文中查找原文，按前后文匹配程度和位置远近选出最佳位置
+        var quote = pick(selectors, 'TextQuoteSelector');
+        var position = pick(selectors, 'TextPositionSelector');
+        if (!quote || !quote.exact) {
+            return null;
+        }
+        if (position && snap.text.slice(position.start, position.end) === quote.exact) {
+            return [position.start, position.end];
+        }
+        var best = null, bestScore = -1;
+        var index = snap.text.indexOf(quote.exact);
+        while (index !== -1) {
+            var score = commonSuffix(snap.text.slice(Math.max(0, index - CONTEXT), index), quote.prefix || '') +
+                commonPrefix(snap.text.slice(index + quote.exact.length, index + quote.exact.length + CONTEXT), quote.suffix || '');
+            if (position) {
+                score -= Math.abs(index - position.start) / (snap.text.length + 1);
+            }
+            if (score > bestScore) {
+                best = index;
+                bestScore = score;
+            }
+            index = snap.text.indexOf(quote.exact, index + 1);
+        }
+        return best === null ? null : [best, best + quote.exact.length];
+    }
+
+    function highlightFor(color) {
+        if (!registered[color]) {
+            var name = 'supperai-' + color.replace(/[^a-zA-Z0-9]/g, '');
+            var style = document.createElement('style');
+            style.textContent = '::highlight(' + name + ') { background-color: ' + color + '; }';
+            document.head.appendChild(style);
+            registered[color] = new Highlight();
+            CSS.highlights.set(name, registered[color]);
+        }
+        return registered[color];
+    }
+
+    function wrapSegments(snap, start, end, color, id) {
+        // 范围内的每个文本节点各自切出对应片段并包裹，不会因跨元素而失败
+        var spans = [];
+        var first = locate(snap, start, false);
+        var index = snap.nodes.indexOf(first.node);
+        for (; index < snap.nodes.length && snap.starts[index] < end; index++) {
+            var node = snap.nodes[index];
+            var from = Math.max(start - snap.starts[index], 0);
+            var to = Math.min(end - snap.starts[index], node.data.length);
+            if (from >= to || node.data.slice(from, to).trim() === '') {
+                continue;
+            }
+            if (to < node.data.length) {
+                node.splitText(to);
+            }
+            var segment = from > 0 ? node.splitText(from) : node;
+            var span = document.createElement('span');
+            span.style.backgroundColor = color;
+            span.className = 'highlight';
+            span.setAttribute('data-hl-id', id);
+            segment.parentNode.insertBefore(span, segment);
+            span.appendChild(segment);
+            spans.push(span);
+        }
+        return spans;
+    }
+
+    function wrap(snap, start, end, id, color) {
+        if (useHighlightApi) {
+            var range = rangeFromOffsets(snap, start, end);
+            highlightFor(color).add(range);
+            entries[id] = {color: color, range: range};
+        } else {
+            entries[id] = {color: color, spans: wrapSegments(snap, start, end, color, id)};
+        }
+    }
+
+    function rangeOf(entry) {
+        if (entry.range) {
+            return entry.range;
+        }
+        var range = document.createRange();
+        if (entry.spans.length) {
+            range.setStartBefore(entry.spans[0]);
+            range.setEndAfter(entry.spans[entry.spans.length - 1]);
+        }
+        return range;
+    }
+
+    function isLive(entry) {
+        if (entry.range) {
+            return entry.range.startContainer.isConnected && !entry.range.collapsed;
+        }
+        return entry.spans.length > 0 && entry.spans[0].isConnected;
+    }
+
+    function unwrap(id) {
+        var entry = entries[id];
+        if (!entry) {
+            return;
+        }
+        if (entry.range) {
+            registered[entry.color].delete(entry.range);
+        } else {
+            entry.spans.forEach(function(span) {
+                var parent = span.parentNode;
+                if (!parent) {
+                    return;
+                }
+                while (span.firstChild) {
+                    parent.insertBefore(span.firstChild, span);
+                }
+                parent.removeChild(span);
+                parent.normalize();
+            });
+        }
+        delete entries[id];
+    }
+
+    function report() {
+        // 把页面上实际显示的划线 id 告诉 Python，读取划线内容时只取这些
+        if (window.__supperai && window.__supperai.notify) {
+            window.__supperai.notify('highlightsAnchored', [JSON.stringify(Object.keys(entries))]);
+        }
+    }
+
+    function anchorPending() {
+        if (!unresolved.length) {
+            return [];
+        }
+        var snap = snapshot();
+        var located = [];
+        var missing = [];
+        unresolved.forEach(function(item) {
+            var offsets = find(snap, item.selectors);
+            if (offsets) {
+                located.push({item: item, start: offsets[0], end: offsets[1]});
+            } else {
+                missing.push(item);
+            }
+        });
+        // 从后往前包裹，前面划线所在的文本节点不受影响
+        located.sort(function(a, b) { return b.start - a.start; });
+        var anchored = [];
+        located.forEach(function(entry) {
+            try {
+                wrap(snap, entry.start, entry.end, entry.item.id, entry.item.color);
+                anchored.push(entry.item.id);
+            } catch (e) {
+                missing.push(entry.item);
+            }
+        });
+        unresolved = missing;
+        if (anchored.length) {
+            report();
+        }
+        if (!unresolved.length && observer) {
+            observer.disconnect();
+            observer = null;
+        }
+        return anchored;
+    }
+
+    function watchForContent() {
+        if (observer || !unresolved.length) {
+            return;
+        }
+        retryUntil = Date.now() + RETRY_MS;
+        observer = new MutationObserver(function() {
+            if (Date.now() > retryUntil) {
+                observer.disconnect();
+                observer = null;
+                return;
+            }
+            clearTimeout(retryTimer);
+            retryTimer = setTimeout(anchorPending, 500);
+        });
+        observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    }
+
+    window.__supperaiHL = {
+        capture: function(id, color) {
+            var selection = window.getSelection();
+            if (!selection || selection.isCollapsed) {
+                return null;
+            }
+            var range = selection.getRangeAt(0);
+            var snap = snapshot();
+            var start = offsetOf(snap, range.startContainer, range.startOffset);
+            var end = offsetOf(snap, range.endContainer, range.endOffset);
+            selection.removeAllRanges();
+            if (start >= end) {
+                return null;
+            }
+            // 选区内已有的划线先去掉，由新划线取代
+            var removed = [];
+            Object.keys(entries).forEach(function(other) {
+                var existing = rangeOf(entries[other]);
+                if (range.compareBoundaryPoints(Range.START_TO_END, existing) > 0 &&
+                        range.compareBoundaryPoints(Range.END_TO_START, existing) < 0) {
+                    removed.push(other);
+                    unwrap(other);
+                }
+            });
+            if (!useHighlightApi && removed.length) {
+                snap = snapshot();
+            }
+            try {
+                wrap(snap, start, end, id, color);
+            } catch (e) {
+                return {removed: removed, selectors: null, error: String(e)};
+            }
+            report();
+            return {removed: removed, selectors: selectorsFor(snap, start, end)};
+        },
+        anchor: function(items) {
+            if (!document.body) {
+                return null;
+            }
+            // 单页应用切换对话后旧的划线已不在文档中，丢弃后按需重新定位
+            Object.keys(entries).forEach(function(id) {
+                if (!isLive(entries[id])) {
+                    unwrap(id);
+                }
+            });
+            unresolved = items.filter(function(item) { return !entries[item.id]; });
+            var anchored = anchorPending();
+            report();
+            watchForContent();
+            return {anchored: anchored.length, pending: unresolved.length};
+        },
+        idAtSelection: function() {
+            var selection = window.getSelection();
+            if (!selection || !selection.rangeCount) {
+                return null;
+            }
+            var range = selection.getRangeAt(0);
+            selection.removeAllRanges();
+            var ids = Object.keys(entries);
+            for (var i = 0; i < ids.length; i++) {
+                if (rangeOf(entries[ids[i]]).isPointInRange(range.startContainer, range.startOffset)) {
+                    return ids[i];
+                }
+            }
+            return null;
+        },
+        remove: function(id) {
+            unwrap(id);
+            unresolved = unresolved.filter(function(item) { return item.id !== id; });
+            report();
+        },
+        removeAll: function() {
+            Object.keys(entries).forEach(unwrap);
+            unresolved = [];
+            report();
+        }
+    };
+})();
+"""
+
+
+class HighlightIndex:
+    # 划线索引：按 (平台, 对话网址) 保存划线的选择器，网址去掉 # 片段。数据在 SQLite 中，按键缓存在内存里；
+    # 平台起始页（新对话页）上的划线不落盘，只保留在本次会话的内存中。读取划线内容只查索引，不需要访问页面
+    def __init__(self, store):
+        self.store = store
+        self.by_key = {}  # (平台, 网址) -> {划线 id: 记录}
+        self.records = {}  # 划线 id -> 记录
+
+    @staticmethod
+    def url_key(url):
+        return QUrl(url).adjusted(QUrl.RemoveFragment).toString()
+
+    @staticmethod
+    def is_conversation_url(url, start_url):
+        # 起始页和站点根路径由多个对话共用，不能作为划线的键
+        return (HighlightIndex.url_key(url) != HighlightIndex.url_key(start_url)
+                and QUrl(url).path() not in ('', '/'))
+
+    def for_key(self, platform, url):
+        key = (platform, self.url_key(url))
+        if key not in self.by_key:
+            records = self.store.highlights_for_url(platform, key[1])
+            self.by_key[key] = {record['id']: record for record in records}
+            self.records.update(self.by_key[key])
+        return self.by_key[key]
+
+    def add(self, platform, url, highlight_id, color, selectors, persist=True):
+        quote = next(s for s in selectors if s['type'] == 'TextQuoteSelector')
+        position = next(s for s in selectors if s['type'] == 'TextPositionSelector')
+        record = {'id': highlight_id, 'url': self.url_key(url), 'platform': platform, 'color': color,
+                  'exact': quote['exact'], 'prefix': quote.get('prefix', ''), 'suffix': quote.get('suffix', ''),
+                  'start': position['start'], 'end': position['end'], 'created': time.strftime("%Y-%m-%d %H:%M:%S")}
+        self.records[highlight_id] = record
+        if persist:
+            self.store.add_highlight(record)
+            self.for_key(platform, url)[highlight_id] = record
+
+    def remove(self, highlight_id):
+        self.store.delete_highlight(highlight_id)
+        record = self.records.pop(highlight_id, None)
+        if record:
+            self.by_key.get((record['platform'], record['url']), {}).pop(highlight_id, None)
+
+    def clear(self, platform, url, highlight_ids=()):
+        # 删除本对话保存的划线，以及页面上仍显示的未落盘划线
+        key = (platform, self.url_key(url))
+        self.store.delete_highlights_for_url(platform, key[1])
+        for highlight_id in list(self.for_key(platform, url)) + list(highlight_ids):
+            self.records.pop(highlight_id, None)
+        self.by_key[key] = {}
+
+    def texts(self, highlight_ids):
+        # 按在页面中的位置排列
+        records = sorted((self.records[i] for i in highlight_ids if i in self.records), key=lambda r: r['start'])
+        return [record['exact'] for record in records]
+
+    def anchor_payload(self, platform, url):
+        return [{'id': r['id'], 'color': r['color'], 'selectors': HighlightIndex.selectors(r)}
+                for r in self.for_key(platform, url).values()]
+
+    @staticmethod
+    def selectors(record):
+        return [
+            {'type': 'TextQuoteSelector', 'exact': record['exact'], 'prefix': record['prefix'],
+             'suffix': record['suffix']},
+            {'type': 'TextPositionSelector', 'start': record['start'], 'end': record['end']},
+        ]
+
+
+class PromptSearchIndex:
+    # "/" 历史补全用的内存索引：对规范化后的提示词建立字符二元组倒排表，新提示词增量加入。
+    # 相同提示词只保留一项并记录使用次数，按最近使用和使用次数排序取前 k 个
+    LARGE_CANDIDATES = 2000  # 候选过多时先按最近使用顺序扫描，避免求交集和排序
+    FREQUENCY_WEIGHT = 20  # 使用次数每翻一倍，相当于“新”了这么多次发送
+
+    def __init__(self):
+        self.entries = {}  # 规范化文本 -> [原始提示词, 使用次数, 最近使用序号]
+        self.recent = OrderedDict()  # 规范化文本，按最近使用排列（最新在末尾）
+        self.postings = {}  # 单字和二元组 -> 规范化文本集合
+        self.sequence = 0
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().split())
+
+    @staticmethod
+    def grams(normalized):
+        grams = set(normalized)
+        grams.update(normalized[i:i + 2] for i in range(len(normalized) - 1))
+        return grams
+
+    def add(self, prompt):
+        normalized = self.normalize(prompt)
+        if not normalized:
+            return
+        self.sequence += 1
+        entry = self.entries.get(normalized)
+        if entry:
+            entry[0] = prompt
+            entry[1] += 1
+            entry[2] = self.sequence
+            self.recent.move_to_end(normalized)
+            return
+        self.entries[normalized] = [prompt, 1, self.sequence]
+        self.recent[normalized] = None
+        for gram in self.grams(normalized):
+            self.postings.setdefault(gram, set()).add(normalized)
+
+    def remove(self, prompt):
+        normalized = self.normalize(prompt)
+        entry = self.entries.get(normalized)
+        if not entry:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del self.entries[normalized]
+        del self.recent[normalized]
+        for gram in self.grams(normalized):
+            posting = self.postings.get(gram)
+            if posting:
+                posting.discard(normalized)
+                if not posting:
+                    del self.postings[gram]
+
+    def score(self, normalized):
+        _, count, last_used = self.entries[normalized]
+        return last_used + self.FREQUENCY_WEIGHT * math.log2(1 + count)
+
+    def search(self, query, k=20):
+        query = self.normalize(query)
+        if not query:
+            return [self.entries[n][0] for n in islice(reversed(self.recent), k)]
+        query_grams = [query] if len(query) == 1 else [query[i:i + 2] for i in range(len(query) - 1)]
+        postings = []
+        for gram in set(query_grams):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        if len(postings[0]) > self.LARGE_CANDIDATES:
+            # 查询由常见字组成，匹配项很多：从最近使用的记录扫描有限条数，凑够 k 个即返回
+            results = []
+            for normalized in islice(reversed(self.recent), self.LARGE_CANDIDATES):
+                if query in normalized:
+                    results.append(self.entries[normalized][0])
+                    if len(results) >= k:
+                        return results
+        candidates = postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+        # 二元组交集可能有误报，再确认是连续子串
+        matches = [n for n in candidates if query in n]
+        return [self.entries[n][0] for n in heapq.nlargest(k, matches, key=self.score)]
+
+
+def search_keys(text):
+    # 检索用的预计算字段：规范化文本、全拼、拼音首字母（未安装 pypinyin 时后两项为空）
+    normalized = ' '.join(text.lower().split())
+    full_pinyin = initials = ''
+    if lazy_pinyin is not None and not normalized.isascii():
+        syllables = [s for s in lazy_pinyin(normalized[:200]) if s.strip()]
+        full_pinyin = ''.join(syllables).replace(' ', '')
+        initials = ''.join(s[0] for s in syllables)
+    return normalized, full_pinyin, initials
+
+
+def is_subsequence(query, text):
+    chars = iter(text)
+    return all(c in chars for c in query)
+
+
+def match_search_keys(query, keys):
+    # query 已规范化；依次尝试子串、拼音、模糊（按顺序出现的字符）匹配
+    normalized, full_pinyin, initials = keys
+    if query in normalized:
+        return True
+    compact = query.replace(' ', '')
+    if compact.isascii() and (compact in full_pinyin or compact in initials):
+        return True
+    if len(compact) >= 3:
+        return is_subsequence(compact, initials) or is_subsequence(compact, normalized[:100])
+    return False
+
+
+class SearchCollection:
+    # 一个可检索集合的预计算索引。索引只在后台线程中读写，界面线程的增删先放入 pending，
+    # 下次检索前由后台线程合并
+    def __init__(self, loader):
+        self.loader = loader  # loader(conn) -> 可迭代的 (id, 文本)
+        self.keys = {}
+        self.pending = deque()
+        self.built = False
+        self.lock = threading.Lock()
+
+    def ensure_built(self, db_path):
+        if self.built:
+            return
+        conn = sqlite3.connect(db_path)
+        try:
+            for item_id, text in self.loader(conn):
+                self.keys[item_id] = search_keys(text)
+        finally:
+            conn.close()
+        self.built = True
+
+    def apply_pending(self):
+        while self.pending:
+            op, item_id, text = self.pending.popleft()
+            if op == 'add':
+                self.keys[item_id] = search_keys(text)
+            else:
+                self.keys.pop(item_id, None)
+
+    def search(self, text):
+        query = ' '.join(text.lower().split())
+        return {item_id for item_id, keys in self.keys.items() if match_search_keys(query, keys)}
+
+
+class SearchTask(QRunnable):
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+
+    def run(self):
+        self.fn()
+
+
+class SearchService(QObject):
+    # 搜索框共用的检索服务：按键输入先去抖，检索在线程池中对预计算索引执行，
+    # 结果回到界面线程后一次性交给处理函数（通常是切换到搜索结果列表）
+    DEBOUNCE_MS = 200
+    results_ready = pyqtSignal(str, int, object)
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.collections = {}
+        self.handlers = {}
+        self.timers = {}
+        self.queries = {}
+        self.generations = {}
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.results_ready.connect(self.on_results_ready)
+
+    def register(self, name, loader, handler):
+        self.collections[name] = SearchCollection(loader)
+        self.handlers[name] = handler
+        self.generations[name] = 0
+        self.queries[name] = ''
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(self.DEBOUNCE_MS)
+        timer.timeout.connect(partial(self.run_query, name))
+        self.timers[name] = timer
+
+    def warm_up(self, name):
+        # 提前在后台建立索引，第一次检索无需等待
+        collection = self.collections[name]
+        self.pool.start(SearchTask(partial(self.build_in_worker, collection)))
+
+    def build_in_worker(self, collection):
+        with collection.lock:
+            collection.ensure_built(self.db_path)
+
+    def request(self, name, text):
+        self.queries[name] = text
+        self.timers[name].start()
+
+    def add_item(self, name, item_id, text):
+        self.collections[name].pending.append(('add', item_id, text))
+
+    def remove_item(self, name, item_id):
+        self.collections[name].pending.append(('remove', item_id, None))
+
+    def run_query(self, name):
+        self.generations[name] += 1
+        text = self.queries[name]
+        if not text.strip():
+            self.handlers[name](None)
+            return
+        self.pool.start(SearchTask(partial(self.search_in_worker, name, self.generations[name], text)))
+
+    def search_in_worker(self, name, generation, text):
+        collection = self.collections[name]
+        with collection.lock:
+            collection.ensure_built(self.db_path)
+            collection.apply_pending()
+            ids = collection.search(text)
+        self.results_ready.emit(name, generation, ids)
+
+    def on_results_ready(self, name, generation, ids):
+        # 丢弃已被更新输入取代的结果
+        if generation == self.generations.get(name):
+            self.handlers[name](ids)
+
+
+class PagedListModel(QAbstractListModel):
+    # 按页读取的列表模型：视图滚动到底部时通过 canFetchMore/fetchMore 取下一页，
+    # 新增和删除只通知插入/移除的那一行，不再整体重建列表。
+    # fetch_page(offset, limit) 返回一页记录，通常是 PromptStore 的查询
+    def __init__(self, fetch_page, page_size=200, parent=None):
+        super().__init__(parent)
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.rows = []
+        self.exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        rows = self.fetch_page(len(self.rows), self.page_size)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        self.insert_fetched(rows)
+
+    def insert_fetched(self, rows):
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    def reload(self):
+        # 排序改变：清空后由视图重新按页读取
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+
+    def entry(self, row):
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        return None
+
+    def prepend(self, entry):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.rows.insert(0, entry)
+        self.endInsertRows()
+
+    def append(self, entry):
+        # 还有未读取的页时，新记录会在读到最后一页时出现
+        if not self.exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+        self.rows.append(entry)
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        if not 0 <= row < len(self.rows):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def remove_id(self, entry_id):
+        # 同一条记录可能同时显示在完整列表和搜索结果中
+        for row, entry in enumerate(self.rows):
+            if entry['id'] == entry_id:
+                self.remove_row(row)
+                return
+
+    def row_background(self, row):
+        # 背景颜色交替显示
+        return QColor('#f0f0f0') if row % 2 == 0 else QColor('#ffffff')
+
+
+class PromptListModel(PagedListModel):
+    # 历史提示词 / 收藏提示词；指定 result_set 时只读取对应检索结果临时表中的记录，用作搜索结果列表
+    def __init__(self, store, table, order='time_desc', page_size=200, parent=None, result_set=None):
+        super().__init__(lambda offset, limit: store.fetch_prompts(table, self.order, '', offset, limit, result_set),
+                         page_size, parent)
+        self.table = table
+        self.order = order
+        # 统一行高（最多显示3行），配合 setUniformItemSizes 让视图无需逐行测量
+        self.row_size = QSize(0, QFontMetrics(QApplication.font()).lineSpacing() * 3 + 10)
+
+    def set_order(self, order):
+        self.order = order
+        self.reload()
+
+    def shows_newest_first(self):
+        return self.order == 'time_desc'
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            # 显示最多3行内容
+            return '\n'.join(item['prompt'].splitlines()[:3])
+        if role == Qt.ToolTipRole:
+            return f"{item['timestamp']}\n{item['prompt']}"  # 悬停显示完整内容和时间
+        if role == Qt.BackgroundRole:
+            return self.row_background(index.row())
+        if role == Qt.ForegroundRole:
+            return QColor('#000000')
+        if role == Qt.SizeHintRole:
+            return self.row_size
+        if role == Qt.UserRole:
+            return item
+        return None
+
+
+class ChatHistoryListModel(PagedListModel):
+    # 历史对话；result_set 的含义同 PromptListModel
+    def __init__(self, store, page_size=200, parent=None, result_set=None):
+        super().__init__(partial(store.fetch_sessions, '', result_set=result_set), page_size, parent)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        chat = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{chat['title']} ({chat['time']})"
+        if role == Qt.BackgroundRole:
+            return self.row_background(index.row())
+        if role == Qt.ForegroundRole:
+            return QColor('#000000')
+        if role == Qt.SizeHintRole:
+            return QSize(0, 30)
+        if role == Qt.UserRole:
+            return chat
+        return None
+
+
+class ClipboardRing(QAbstractListModel):
+    # 剪贴板记录：固定容量的环形缓冲区，最新的在最前。相同内容按哈希去重（移到最前并计数），
+    # 程序自己为发送提示词而做的复制不记录；超出容量的旧记录可选追加到磁盘归档
+    SUPPRESS_SECONDS = 10
+    PREVIEW_CHARS = 200
+
+    def __init__(self, capacity=200, spill_path=None, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.entries = []  # 最新的在最前：{'hash', 'text', 'time', 'count'}
+        self.hashes = {}  # 哈希 -> 记录
+        self.suppressed = {}  # 哈希 -> 过期时间
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def suppress(self, text):
+        # 即将由程序写入剪贴板的内容，在短时间内出现时忽略
+        self.suppressed[self.content_hash(text)] = time.time() + self.SUPPRESS_SECONDS
+
+    def add(self, text):
+        if not text.strip():
+            return
+        digest = self.content_hash(text)
+        now = time.time()
+        self.suppressed = {h: expiry for h, expiry in self.suppressed.items() if expiry > now}
+        if self.suppressed.pop(digest, None):
+            return
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        entry = self.hashes.get(digest)
+        if entry is not None:
+            entry['time'] = timestamp
+            entry['count'] += 1
+            row = self.entries.index(entry)
+            if row > 0:
+                self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), 0)
+                self.entries.insert(0, self.entries.pop(row))
+                self.endMoveRows()
+            else:
+                self.dataChanged.emit(self.index(0), self.index(0))
+            return
+        entry = {'hash': digest, 'text': text, 'time': timestamp, 'count': 1}
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.entries.insert(0, entry)
+        self.hashes[digest] = entry
+        self.endInsertRows()
+        if len(self.entries) > self.capacity:
+            self.remove_row(len(self.entries) - 1, spill=True)
+
+    def remove_row(self, row, spill=False):
+        if not 0 <= row < len(self.entries):
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        entry = self.entries.pop(row)
+        del self.hashes[entry['hash']]
+        self.endRemoveRows()
+        if spill and self.spill_path:
+            LOG_WRITER.write(self.spill_path, json.dumps(
+                {'time': entry['time'], 'count': entry['count'], 'text': entry['text']}, ensure_ascii=False) + '\n')
+
+    def clear(self):
+        self.beginResetModel()
+        self.entries = []
+        self.hashes = {}
+        self.endResetModel()
+
+    def entry(self, row):
+        if 0 <= row < len(self.entries):
+            return self.entries[row]
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        entry = self.entry(index.row())
+        if entry is None:
+            return None
+        if role == Qt.DisplayRole:
+            preview = ' '.join(entry['text'][:self.PREVIEW_CHARS].split())
+            if len(entry['text']) > self.PREVIEW_CHARS:
+                preview += '…'
+            count = f" ×{entry['count']}" if entry['count'] > 1 else ''
+            return f"{preview}\n（复制于 {entry['time']}{count}）"
+        if role == Qt.ToolTipRole:
+            return entry['text'][:2000]
+        if role == Qt.UserRole:
+            return entry['text']
+        return None
+
+
 class PromptManager(QWidget):
+    PAGE_SIZE = 200  # 列表每次从数据库读取的条数
+
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
@@ -371,14 +1998,32 @@ class PromptManager(QWidget):
         self.resize(1000, 600)  # 默认大小
 
         # 初始化数据
-        self.history = []
-        self.favorites = []
-        self.chat_history = []  # 历史对话
         self.common_ai_data = []  # 常用AI
+        # 历史、收藏和历史对话存放在 SQLite 中，由列表模型按页读取
+        self.store = self.main_window.store
+        self.history_model = PromptListModel(self.store, 'prompts', 'time_desc', self.PAGE_SIZE, self)
+        self.favorites_model = PromptListModel(self.store, 'favorites', 'id_asc', self.PAGE_SIZE, self)
+        self.chat_history_model = ChatHistoryListModel(self.store, self.PAGE_SIZE, self)
+        # 检索在后台线程执行，结果显示在单独的按页读取的列表模型中
+        self.history_search_model = PromptListModel(self.store, 'prompts', 'time_desc', self.PAGE_SIZE, self,
+                                                    result_set='history')
+        self.favorites_search_model = PromptListModel(self.store, 'favorites', 'id_asc', self.PAGE_SIZE, self,
+                                                      result_set='favorites')
+        self.chat_history_search_model = ChatHistoryListModel(self.store, self.PAGE_SIZE, self,
+                                                              result_set='chat_history')
+        self.search_service = SearchService(self.store.path, self)
+        self.search_service.register('history', lambda conn: conn.execute('SELECT id, prompt FROM prompts'),
+                                     partial(self.show_search_results, 'history'))
+        self.search_service.register('favorites', lambda conn: conn.execute('SELECT id, prompt FROM favorites'),
+                                     partial(self.show_search_results, 'favorites'))
+        self.search_service.register('chat_history', lambda conn: conn.execute('SELECT id, title FROM sessions'),
+                                     partial(self.show_search_results, 'chat_history'))
+        QTimer.singleShot(2000, self.warm_up_search)
+        # "/" 补全索引在启动后分批建立，之后随新提示词增量更新
+        self.search_index = PromptSearchIndex()
+        self.search_index_loader = self.store.iter_prompts('prompts', 'time_asc')
+        QTimer.singleShot(0, self.build_search_index)
 
-        self.load_history()
-        self.load_favorites()
-        self.load_chat_history()
         self.load_common_ai()
 
         splitter = QSplitter(Qt.Horizontal)
@@ -397,9 +2042,18 @@ class PromptManager(QWidget):
         self.add_prompt_tab(title="提示词", closable=False)
 
         # 添加剪贴板标签页 (不可关闭)
-        self.clipboard_tab = QTextEdit()
-        self.clipboard_tab.setPlaceholderText("剪贴板内容")
-        self.clipboard_tab.setReadOnly(False)
+        config = self.main_window.config
+        self.clipboard_ring = ClipboardRing(
+            config.get('clipboard_capacity', 200),
+            'clipboard_archive.jsonl' if config.get('clipboard_spill_to_disk', False) else None, self)
+        self.clipboard_tab = QListView()
+        self.clipboard_tab.setModel(self.clipboard_ring)
+        self.clipboard_tab.setUniformItemSizes(True)
+        self.clipboard_tab.setAlternatingRowColors(True)
+        self.clipboard_tab.setToolTip("双击插入到提示词，右键更多操作")
+        self.clipboard_tab.doubleClicked.connect(self.insert_clipboard_entry)
+        self.clipboard_tab.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.clipboard_tab.customContextMenuRequested.connect(self.show_clipboard_menu)
         index = self.tabs.addTab(self.clipboard_tab, "剪贴板")
         self.tabs.tabBar().setTabButton(index, QTabBar.RightSide, None)  # 移除关闭按钮
 
@@ -408,9 +2062,12 @@ class PromptManager(QWidget):
         self.browser_tabs.setTabsClosable(True)
         self.browser_tabs.tabCloseRequested.connect(self.close_browser_tab)
         self.browser_tabs.setMovable(True)
-        self.add_browser_tab()
+        self.add_browser_tab(lazy=True)
         index = self.tabs.addTab(self.browser_tabs, "浏览器")
         self.tabs.tabBar().setTabButton(index, QTabBar.RightSide, None)  # 移除关闭按钮
+        # 浏览器标签页在第一次显示时才创建 QWebEngineView
+        self.tabs.currentChanged.connect(self.ensure_current_browser_tab)
+        self.browser_tabs.currentChanged.connect(self.ensure_current_browser_tab)
 
         # 右侧：历史、收藏和历史对话区域，占30%
         right_widget = QWidget()
@@ -430,30 +2087,26 @@ class PromptManager(QWidget):
         right_layout.addWidget(self.right_tabs)
 
         # 历史提示词列表
-        self.history_list = QListWidget()
-        self.history_list.setSelectionMode(QListWidget.SingleSelection)
+        self.history_list = self.create_list_view(self.history_model)
         self.history_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.history_list.customContextMenuRequested.connect(self.show_history_context_menu)
-        self.history_list.itemDoubleClicked.connect(self.handle_history_item_double_clicked)
+        self.history_list.doubleClicked.connect(self.handle_history_item_double_clicked)
 
         # 收藏提示词列表
-        self.favorites_list = QListWidget()
-        self.favorites_list.setSelectionMode(QListWidget.SingleSelection)
+        self.favorites_list = self.create_list_view(self.favorites_model)
         self.favorites_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.favorites_list.customContextMenuRequested.connect(self.show_favorites_context_menu)
-        self.favorites_list.itemDoubleClicked.connect(self.handle_favorites_item_double_clicked)
+        self.favorites_list.doubleClicked.connect(self.handle_favorites_item_double_clicked)
 
         # 历史对话列表
-        self.chat_history_list = QListWidget()
-        self.chat_history_list.setSelectionMode(QListWidget.SingleSelection)
+        self.chat_history_list = self.create_list_view(self.chat_history_model)
         self.chat_history_list.setToolTip("双击历史对话恢复")
-        self.chat_history_list.setUniformItemSizes(True)
-        self.chat_history_list.itemDoubleClicked.connect(self.load_chat_history_item)
+        self.chat_history_list.doubleClicked.connect(self.load_chat_history_item)
 
         # 添加到右侧标签页
-        self.right_tabs.addTab(self.create_searchable_list_widget(self.history_list), "历史提示词")
-        self.right_tabs.addTab(self.create_searchable_list_widget(self.favorites_list), "收藏提示词")
-        self.right_tabs.addTab(self.create_searchable_list_widget(self.chat_history_list), "历史对话")
+        self.right_tabs.addTab(self.create_searchable_list_widget(self.history_list, self.search_history), "历史提示词")
+        self.right_tabs.addTab(self.create_searchable_list_widget(self.favorites_list, self.search_favorites), "收藏提示词")
+        self.right_tabs.addTab(self.create_searchable_list_widget(self.chat_history_list, self.search_chat_history), "历史对话")
         self.right_tabs.addTab(self.create_common_ai_tab(), "常用AI")
 
         # 加载用户的标签顺序
@@ -473,10 +2126,6 @@ class PromptManager(QWidget):
         sort_layout.addStretch()
         right_layout.addLayout(sort_layout)
 
-        self.update_history_list()
-        self.update_favorites_list()
-        self.update_chat_history_list()
-
         # 初始化剪贴板监视
         self.clipboard = QApplication.clipboard()
         self.clipboard.dataChanged.connect(self.on_clipboard_change)
@@ -498,7 +2147,11 @@ class PromptManager(QWidget):
         # 搜索框
         self.common_ai_search = QLineEdit()
         self.common_ai_search.setPlaceholderText("搜索")
-        self.common_ai_search.textChanged.connect(self.filter_common_ai_tree)
+        self.common_ai_filter_timer = QTimer(self)
+        self.common_ai_filter_timer.setSingleShot(True)
+        self.common_ai_filter_timer.setInterval(SearchService.DEBOUNCE_MS)
+        self.common_ai_filter_timer.timeout.connect(lambda: self.filter_common_ai_tree(self.common_ai_search.text()))
+        self.common_ai_search.textChanged.connect(self.common_ai_filter_timer.start)
 
         # 常用AI树形结构
         self.common_ai_tree = QTreeWidget()
@@ -557,7 +2210,8 @@ class PromptManager(QWidget):
                 # 在AI浏览器区域打开
                 # 假设有一个特定的AI浏览器标签
                 if not hasattr(self, 'ai_browser_tab'):
-                    self.ai_browser_tab = QWebEngineView()
+                    self.ai_browser_tab = self.main_window.profile_manager.create_view(url)
+                    self.main_window.lifecycle.register(self.ai_browser_tab, "AI 浏览器")
                     index = self.tabs.addTab(self.ai_browser_tab, "AI 浏览器")
                 self.tabs.setCurrentWidget(self.ai_browser_tab)
                 self.ai_browser_tab.load(QUrl(url))
@@ -632,9 +2286,11 @@ class PromptManager(QWidget):
             self.save_common_ai()
 
     def filter_common_ai_tree(self, text):
-        # 简单的过滤功能
+        # 使用建树时预先计算的检索字段（含拼音），一次过滤后再统一刷新
+        query = ' '.join(text.lower().split())
+
         def filter_item(item):
-            match = text.lower() in item.text(0).lower()
+            match = not query or match_search_keys(query, item.data(0, Qt.UserRole + 1))
             item.setHidden(not match)
             for i in range(item.childCount()):
                 child = item.child(i)
@@ -644,9 +2300,11 @@ class PromptManager(QWidget):
                     match = True
             return match
 
+        self.common_ai_tree.setUpdatesEnabled(False)
         for i in range(self.common_ai_tree.topLevelItemCount()):
             top_item = self.common_ai_tree.topLevelItem(i)
             filter_item(top_item)
+        self.common_ai_tree.setUpdatesEnabled(True)
 
     def update_common_ai_tree(self):
         self.common_ai_tree.clear()
@@ -655,6 +2313,7 @@ class PromptManager(QWidget):
             for item_data in items:
                 item = QTreeWidgetItem(parent)
                 item.setText(0, item_data['name'])
+                item.setData(0, Qt.UserRole + 1, search_keys(item_data['name']))
                 if 'url' in item_data:
                     item.setData(0, Qt.UserRole, item_data['url'])
                     item.setIcon(0, self.web_icon)
@@ -692,8 +2351,9 @@ class PromptManager(QWidget):
     def save_tab_order(self):
         order = [self.right_tabs.tabText(i) for i in range(self.right_tabs.count())]
         self.main_window.config['right_tab_order'] = order
+        self.main_window.save_config()
 
-    def add_browser_tab(self, url=None):
+    def add_browser_tab(self, url=None, lazy=False):
         browser_widget = QWidget()
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
@@ -704,26 +2364,44 @@ class PromptManager(QWidget):
             address_bar.setText(url)
         else:
             address_bar.setText("https://www.baidu.com")
-        address_bar.returnPressed.connect(lambda: self.load_browser_url(browser, address_bar.text()))
         layout.addWidget(address_bar)
+        browser_widget.setLayout(layout)
+        browser_widget.address_bar = address_bar
+        browser_widget.browser = None
+
+        index = self.browser_tabs.addTab(browser_widget, "新标签页")
+        if lazy:
+            # 占位：只有地址栏，切换到该标签页时再创建浏览器
+            address_bar.returnPressed.connect(lambda: self.ensure_browser_tab(browser_widget))
+        else:
+            self.ensure_browser_tab(browser_widget)
+        self.browser_tabs.setCurrentIndex(index)
+
+    def ensure_current_browser_tab(self, _index=None):
+        if self.tabs.currentWidget() is self.browser_tabs:
+            browser_widget = self.browser_tabs.currentWidget()
+            if browser_widget is not None:
+                self.ensure_browser_tab(browser_widget)
+
+    def ensure_browser_tab(self, browser_widget):
+        if browser_widget.browser is not None:
+            return
+        address_bar = browser_widget.address_bar
+        try:
+            address_bar.returnPressed.disconnect()
+        except TypeError:
+            pass
+        address_bar.returnPressed.connect(lambda: self.load_browser_url(browser, address_bar.text()))
 
         # 浏览器
-        browser = QWebEngineView()
+        browser = self.main_window.profile_manager.create_view(address_bar.text())
+        browser_widget.browser = browser
+        self.main_window.lifecycle.register(browser, "浏览器标签页")
         browser.load(QUrl(address_bar.text()))
         browser.urlChanged.connect(lambda url: address_bar.setText(url.toString()))
         browser.loadFinished.connect(lambda: self.update_browser_tab_title(browser))
 
-        # 移除无效的 linkClicked 信号连接
-        # browser.page().linkClicked.connect(lambda url: browser.setUrl(url))  # 已删除
-
-        layout.addWidget(browser)
-        browser_widget.setLayout(layout)
-
-        # 获取标题
-        self.update_browser_tab_title(browser)
-
-        index = self.browser_tabs.addTab(browser_widget, "新标签页")
-        self.browser_tabs.setCurrentIndex(index)
+        browser_widget.layout().addWidget(browser)
 
 
     def update_browser_tab_title(self, browser):
@@ -744,7 +2422,12 @@ class PromptManager(QWidget):
 
     def close_browser_tab(self, index):
         if self.browser_tabs.count() > 1:
+            browser_widget = self.browser_tabs.widget(index)
             self.browser_tabs.removeTab(index)
+            # 关闭的标签页要释放浏览器，否则渲染进程一直占用内存
+            if browser_widget.browser is not None:
+                self.main_window.lifecycle.unregister(browser_widget.browser)
+            browser_widget.deleteLater()
         else:
             QMessageBox.warning(self, "提示", "无法关闭最后一个标签页。")
 
@@ -762,7 +2445,16 @@ class PromptManager(QWidget):
         extract_items(self.common_ai_data)
         return url_title_map
 
-    def create_searchable_list_widget(self, list_widget):
+    def create_list_view(self, model):
+        list_view = QListView()
+        list_view.setModel(model)
+        list_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        list_view.setUniformItemSizes(True)
+        list_view.setWordWrap(True)
+        list_view.setTextElideMode(Qt.ElideRight)
+        return list_view
+
+    def create_searchable_list_widget(self, list_widget, search_callback):
         # 创建一个包含搜索栏和列表的部件
         widget = QWidget()
         layout = QVBoxLayout()
@@ -773,17 +2465,8 @@ class PromptManager(QWidget):
         layout.addWidget(list_widget)
         widget.setLayout(layout)
 
-        # 连接搜索栏的信号到过滤函数
-        def filter_list(text):
-            text = text.lower()
-            for i in range(list_widget.count()):
-                item = list_widget.item(i)
-                item_text = item.text().lower()
-                if text in item_text:
-                    item.setHidden(False)
-                else:
-                    item.setHidden(True)
-        search_bar.textChanged.connect(filter_list)
+        # 检索服务负责去抖和后台匹配
+        search_bar.textChanged.connect(search_callback)
 
         return widget
 
@@ -803,177 +2486,118 @@ class PromptManager(QWidget):
     def send_prompt(self, prompt):
         self.current_prompt = prompt  # Save current prompt for checking
         self.add_to_history(prompt)
+        # 各平台的发送确认与重发由 SendConfirmation 处理
         self.main_window.send_prompt_to_all(prompt)
-        # After sending, check if AI text boxes are empty
-        QTimer.singleShot(1000, self.check_ai_textboxes)
-
-    def check_ai_textboxes(self):
-        resend_needed = False
-        for ai_widget in self.main_window.ai_platform_widgets:
-            if not ai_widget.has_cleared_text():
-                resend_needed = True
-                ai_widget.send_prompt(self.current_prompt)
-        # No message prompts as per requirement
-
-    def load_history(self):
-        # 整合 prompt_history.log 和 prompt_send.log
-        if os.path.exists('prompt_history.log'):
-            with open('prompt_history.log', 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            timestamp, prompt = line.strip().split('\t', 1)
-                            self.history.append({'timestamp': timestamp, 'prompt': prompt})
-                        except ValueError:
-                            pass  # 忽略格式错误的行
-        # 移除对 prompt_send.log 的依赖
-        # if os.path.exists('prompt_send.log'):
-        #     with open('prompt_send.log', 'r', encoding='utf-8') as f:
-        #         for line in f:
-        #             if line.strip():
-        #                 timestamp, prompt = line.strip().split('\t', 1)
-        #                 self.history.append({'timestamp': timestamp, 'prompt': prompt})
-        else:
-            self.history = []
 
-    def load_favorites(self):
-        if os.path.exists('prompt_favorites.log'):
-            with open('prompt_favorites.log', 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            timestamp, prompt = line.strip().split('\t', 1)
-                            self.favorites.append({'timestamp': timestamp, 'prompt': prompt})
-                        except ValueError:
-                            pass  # 忽略格式错误的行
+    def build_search_index(self):
+        # 每次事件循环只处理一批，避免历史很多时卡住界面
+        if self.search_index_loader is None:
+            return
+        count = 0
+        for entry in islice(self.search_index_loader, 2000):
+            self.search_index.add(entry['prompt'])
+            count += 1
+        if count < 2000:
+            self.search_index_loader = None
         else:
-            self.favorites = []
+            QTimer.singleShot(0, self.build_search_index)
 
-    def load_chat_history(self):
-        if os.path.exists('chat_history.log'):
-            with open('chat_history.log', 'r', encoding='utf-8') as f:
-                self.chat_history = json.load(f)
-        else:
-            self.chat_history = []
+    def search_prompts(self, text, limit):
+        if self.search_index_loader is not None:
+            # 索引尚未建完，先查数据库
+            return [p['prompt'] for p in self.store.fetch_prompts('prompts', 'time_desc', text, 0, limit)]
+        return self.search_index.search(text, limit)
 
-    def save_chat_history(self):
-        with open('chat_history.log', 'w', encoding='utf-8') as f:
-            json.dump(self.chat_history, f, indent=4, ensure_ascii=False)
+    def warm_up_search(self):
+        for name in ('history', 'favorites', 'chat_history'):
+            self.search_service.warm_up(name)
+
+    def search_views(self, name):
+        # (列表视图, 完整列表模型, 搜索结果模型)
+        return {
+            'history': (self.history_list, self.history_model, self.history_search_model),
+            'favorites': (self.favorites_list, self.favorites_model, self.favorites_search_model),
+            'chat_history': (self.chat_history_list, self.chat_history_model, self.chat_history_search_model),
+        }[name]
+
+    def show_search_results(self, name, ids):
+        # ids 为 None 表示搜索框已清空，切回完整列表
+        list_view, model, search_model = self.search_views(name)
+        if ids is not None:
+            self.store.set_search_results(name, ids)
+            search_model.reload()
+            model = search_model
+        if list_view.model() is not model:
+            list_view.setModel(model)
+
+    @staticmethod
+    def list_entry(list_view, index):
+        if not index.isValid():
+            return None
+        return list_view.model().entry(index.row())
+
+    def search_history(self, text):
+        self.search_service.request('history', text)
+
+    def search_favorites(self, text):
+        self.search_service.request('favorites', text)
+
+    def search_chat_history(self, text):
+        self.search_service.request('chat_history', text)
 
     def add_to_chat_history(self, title, urls):
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        self.chat_history.insert(0, {'title': title, 'urls': urls, 'time': timestamp})
-        # 限制历史对话记录数量
-        if len(self.chat_history) > 100:
-            self.chat_history = self.chat_history[:100]
-        self.update_chat_history_list()
-        self.save_chat_history()
-
-    def update_chat_history_list(self):
-        self.chat_history_list.clear()
-        for index, chat in enumerate(self.chat_history):
-            item = QListWidgetItem(f"{chat['title']} ({chat['time']})")
-            if index % 2 == 0:
-                item.setBackground(QColor('#f0f0f0'))
-            else:
-                item.setBackground(QColor('#ffffff'))
-            item.setForeground(QColor('#000000'))
-            item.setSizeHint(QSize(item.sizeHint().width(), 30))
-            self.chat_history_list.addItem(item)
+        chat = self.store.add_session(title, urls, timestamp)
+        self.chat_history_model.prepend(chat)
+        self.search_service.add_item('chat_history', chat['id'], title)
 
-    def load_chat_history_item(self, item):
-        index = self.chat_history_list.row(item)
-        chat = self.chat_history[index]
-        # 加载对应的浏览器网址
-        self.main_window.load_chat_history(chat)
+    def load_chat_history_item(self, index):
+        chat = self.list_entry(self.chat_history_list, index)
+        if chat:
+            # 加载对应的浏览器网址
+            self.main_window.load_chat_history(chat)
 
     def add_to_history(self, prompt):
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        self.history.insert(0, {'timestamp': timestamp, 'prompt': prompt})
-        # Limit history size to 100
-        if len(self.history) > 100:
-            self.history = self.history[:100]
-        self.update_history_list()
-        # Save to file
-        with open('prompt_history.log', 'w', encoding='utf-8') as f:
-            for item in self.history:
-                f.write(f"{item['timestamp']}\t{item['prompt']}\n")
-
-    def update_history_list(self):
-        self.history_list.clear()
-        for index, item in enumerate(self.history):
-            # 显示最多3行内容
-            display_text = '\n'.join(item['prompt'].splitlines()[:3])
-            list_item = QListWidgetItem(display_text)
-            list_item.setToolTip(f"{item['timestamp']}\n{item['prompt']}")  # 悬停显示完整内容和时间
-            # 背景颜色交替显示
-            if index % 2 == 0:
-                list_item.setBackground(QColor('#f0f0f0'))
-            else:
-                list_item.setBackground(QColor('#ffffff'))
-            list_item.setForeground(QColor('#000000'))
-            self.history_list.addItem(list_item)
-
-    def update_favorites_list(self):
-        self.favorites_list.clear()
-        for index, item in enumerate(self.favorites):
-            # 显示最多3行内容
-            display_text = '\n'.join(item['prompt'].splitlines()[:3])
-            list_item = QListWidgetItem(display_text)
-            list_item.setToolTip(f"{item['timestamp']}\n{item['prompt']}")  # 悬停显示完整内容和时间
-            # 背景颜色交替显示
-            if index % 2 == 0:
-                list_item.setBackground(QColor('#f0f0f0'))
-            else:
-                list_item.setBackground(QColor('#ffffff'))
-            list_item.setForeground(QColor('#000000'))
-            self.favorites_list.addItem(list_item)
+        entry = self.store.add_prompt('prompts', prompt, timestamp)
+        self.search_service.add_item('history', entry['id'], prompt)
+        if self.search_index_loader is None:
+            # 索引仍在建立时，新提示词会由分批读取按时间顺序读到
+            self.search_index.add(prompt)
+        if self.history_model.shows_newest_first():
+            self.history_model.prepend(entry)
+        else:
+            self.history_model.reload()
 
     def favorite_history_item(self):
-        selected_items = self.history_list.selectedItems()
-        if not selected_items:
-            return
-        item = selected_items[0]
-        index = self.history_list.row(item)
-        prompt = self.history[index]['prompt']
-        self.add_to_favorites(prompt)
+        entry = self.list_entry(self.history_list, self.history_list.currentIndex())
+        if entry:
+            self.add_to_favorites(entry['prompt'])
 
     def add_to_favorites(self, prompt):
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        if not any(fav['prompt'] == prompt for fav in self.favorites):
-            self.favorites.append({'timestamp': timestamp, 'prompt': prompt})
-            self.update_favorites_list()
-            # Save to file
-            with open('prompt_favorites.log', 'w', encoding='utf-8') as f:
-                for item in self.favorites:
-                    f.write(f"{item['timestamp']}\t{item['prompt']}\n")
+        entry = self.store.add_prompt('favorites', prompt, timestamp)
+        if entry:
+            self.favorites_model.append(entry)
+            self.search_service.add_item('favorites', entry['id'], prompt)
             QMessageBox.information(self, "收藏成功", f"已将提示词添加到收藏列表。")
 
     def delete_history_item(self):
-        selected_items = self.history_list.selectedItems()
-        if not selected_items:
-            return
-        item = selected_items[0]
-        index = self.history_list.row(item)
-        del self.history[index]
-        self.update_history_list()
-        # 保存更新后的历史提示词
-        with open('prompt_history.log', 'w', encoding='utf-8') as f:
-            for item in self.history:
-                f.write(f"{item['timestamp']}\t{item['prompt']}\n")
+        entry = self.list_entry(self.history_list, self.history_list.currentIndex())
+        if entry:
+            self.store.delete_prompt('prompts', entry['id'])
+            self.search_index.remove(entry['prompt'])
+            self.search_service.remove_item('history', entry['id'])
+            self.history_model.remove_id(entry['id'])
+            self.history_search_model.remove_id(entry['id'])
 
     def delete_favorite_item(self):
-        selected_items = self.favorites_list.selectedItems()
-        if not selected_items:
-            return
-        item = selected_items[0]
-        index = self.favorites_list.row(item)
-        del self.favorites[index]
-        self.update_favorites_list()
-        # 保存更新后的收藏列表
-        with open('prompt_favorites.log', 'w', encoding='utf-8') as f:
-            for item in self.favorites:
-                f.write(f"{item['timestamp']}\t{item['prompt']}\n")
+        entry = self.list_entry(self.favorites_list, self.favorites_list.currentIndex())
+        if entry:
+            self.store.delete_prompt('favorites', entry['id'])
+            self.search_service.remove_item('favorites', entry['id'])
+            self.favorites_model.remove_id(entry['id'])
+            self.favorites_search_model.remove_id(entry['id'])
 
     def show_history_context_menu(self, position):
         menu = QMenu()
@@ -992,15 +2616,15 @@ class PromptManager(QWidget):
         menu.addAction(delete_action)
         menu.exec_(self.favorites_list.viewport().mapToGlobal(position))
 
-    def handle_history_item_double_clicked(self, item):
-        index = self.history_list.row(item)
-        prompt_text = self.history[index]['prompt']
-        self.set_current_prompt(prompt_text)
+    def handle_history_item_double_clicked(self, index):
+        entry = self.list_entry(self.history_list, index)
+        if entry:
+            self.set_current_prompt(entry['prompt'])
 
-    def handle_favorites_item_double_clicked(self, item):
-        index = self.favorites_list.row(item)
-        prompt_text = self.favorites[index]['prompt']
-        self.set_current_prompt(prompt_text)
+    def handle_favorites_item_double_clicked(self, index):
+        entry = self.list_entry(self.favorites_list, index)
+        if entry:
+            self.set_current_prompt(entry['prompt'])
 
     def set_current_prompt(self, text):
         current_tab = self.tabs.currentWidget()
@@ -1010,58 +2634,1114 @@ class PromptManager(QWidget):
     def on_clipboard_change(self):
         data = self.clipboard.mimeData()
         if data.hasText():
-            text = data.text()
-            source_info = f"（复制于 {time.strftime('%Y-%m-%d %H:%M:%S')}）"
-            # Append at the end
-            self.clipboard_tab.append(text + '\n' + source_info + '\n')
-            # Scroll to the end
-            cursor = self.clipboard_tab.textCursor()
-            cursor.movePosition(cursor.End)
-            self.clipboard_tab.setTextCursor(cursor)
+            self.clipboard_ring.add(data.text())
+
+    def insert_clipboard_entry(self, index):
+        text = self.clipboard_ring.data(index, Qt.UserRole)
+        current_tab = self.tabs.widget(0)
+        if text and isinstance(current_tab, PromptTab):
+            self.tabs.setCurrentWidget(current_tab)
+            current_tab.text_edit.insertPlainText(text)
+
+    def show_clipboard_menu(self, position):
+        index = self.clipboard_tab.indexAt(position)
+        menu = QMenu()
+        if index.isValid():
+            insert_action = menu.addAction("插入到提示词")
+            insert_action.triggered.connect(lambda: self.insert_clipboard_entry(index))
+            copy_action = menu.addAction("复制")
+            copy_action.triggered.connect(lambda: self.clipboard.setText(self.clipboard_ring.data(index, Qt.UserRole)))
+            delete_action = menu.addAction("删除")
+            delete_action.triggered.connect(lambda: self.clipboard_ring.remove_row(index.row()))
+        clear_action = menu.addAction("清空")
+        clear_action.triggered.connect(self.clipboard_ring.clear)
+        menu.exec_(self.clipboard_tab.viewport().mapToGlobal(position))
 
     def sort_history(self):
-        sort_mode = self.sort_combo.currentData()
-        if sort_mode == "time_desc":
-            self.history.sort(reverse=True, key=lambda x: x['timestamp'])
-        elif sort_mode == "time_asc":
-            self.history.sort(key=lambda x: x['timestamp'])
-        elif sort_mode == "content_asc":
-            self.history.sort(key=lambda x: x['prompt'].lower())
-        elif sort_mode == "content_desc":
-            self.history.sort(reverse=True, key=lambda x: x['prompt'].lower())
-        self.update_history_list()
+        # 排序由数据库完成，模型重新按页读取
+        self.history_model.set_order(self.sort_combo.currentData())
+        self.history_search_model.set_order(self.sort_combo.currentData())
+
+# 站点适配器：每个站点的输入框、发送方式和消息节点选择器定义在 sites/*.json 中，
+# 新增站点只需添加数据文件，无需修改代码
+SITES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sites')
+
+# 页面运行时脚本：页面加载时通过 QWebEngineScript 注入一次，按域名选择适配器，
+# 提供 window.__supperai.send(text, token)，发送时只需传入 JSON 编码的提示词
+SUPPERAI_RUNTIME_JS = """
+(function() {
+    if (window.__supperai) {
+        return;
+    }
+    var adapters = __SUPPERAI_ADAPTERS__;
+    var host = location.hostname;
+    var adapter = null;
+    var fallback = null;
+    adapters.forEach(function(a) {
+        if (!a.domains.length) {
+            fallback = fallback || a;
+        } else if (!adapter && a.domains.some(function(d) { return host.indexOf(d) !== -1; })) {
+            adapter = a;
+        }
+    });
+    adapter = adapter || fallback;
+    var sends = {};
+
+    // QWebChannel 桥：发送确认和回复片段通过页面中的 supperai 对象回传 Python，
+    // 没有 QWebChannel 时退回到控制台消息
+    var bridge = null;
+    var bridgeCalls = [];
+    var hasChannel = typeof QWebChannel !== 'undefined' && window.qt && qt.webChannelTransport;
+    if (hasChannel) {
+        new QWebChannel(qt.webChannelTransport, function(channel) {
+            bridge = channel.objects.supperai;
+            bridgeCalls.forEach(function(call) { bridge[call[0]].apply(bridge, call[1]); });
+            bridgeCalls = [];
+        });
+    }
+
+    function notify(method, args, fallback) {
+        if (bridge) {
+            bridge[method].apply(bridge, args);
+        } else if (hasChannel) {
+            bridgeCalls.push([method, args]);
+        } else if (fallback) {
+            fallback();
+        }
+    }
+
+    function findInput() {
+        return document.querySelector(adapter.input);
+    }
+
+    function readInput(input) {
+        var value = ('value' in input) ? input.value : input.textContent;
+        return value || '';
+    }
+
+    function setInput(input, text) {
+        input.focus();
+        var useValue = adapter.input_mode === 'value' ||
+            (adapter.input_mode === 'auto' && 'value' in input);
+        if (useValue) {
+            // 使用浏览器原生的 value setter，React 等框架才能感知到变化
+            var proto = input instanceof HTMLInputElement ? HTMLInputElement.prototype : HTMLTextAreaElement.prototype;
+            Object.getOwnPropertyDescriptor(proto, 'value').set.call(input, text);
+        } else {
+            input.innerHTML = '';
+            input.focus();
+            document.execCommand('insertText', false, text);
+        }
+        input.dispatchEvent(new Event('input', { bubbles: true }));
+    }
+
+    function pressEnter(input) {
+        var init = { key: 'Enter', code: 'Enter', keyCode: 13, which: 13, bubbles: true, cancelable: true };
+        input.dispatchEvent(new KeyboardEvent('keydown', init));
+        input.dispatchEvent(new KeyboardEvent('keyup', init));
+    }
+
+    function findSendButton() {
+        var selectors = adapter.send_button || [];
+        for (var i = 0; i < selectors.length; i++) {
+            var btn = document.querySelector(selectors[i]);
+            if (btn) {
+                return btn;
+            }
+        }
+        return null;
+    }
+
+    function submit(input) {
+        if (adapter.submit === 'enter') {
+            pressEnter(input);
+            if (adapter.resubmit_if_not_cleared) {
+                // 检查发送是否成功
+                setTimeout(function() {
+                    if (readInput(input).trim() !== '') {
+                        pressEnter(input);
+                    }
+                }, 500);
+            }
+            return;
+        }
+        var btn = findSendButton();
+        if (btn) {
+            btn.click();
+        } else if (adapter.enter_fallback) {
+            console.log('未找到发送按钮，尝试模拟按下 Enter 键');
+            pressEnter(input);
+        } else {
+            console.log('未找到发送按钮');
+        }
+    }
+
+    // 发送确认：记录发送前用户消息节点数量，输入框被清空且出现新的用户消息节点后，
+    // 通过控制台输出 SEND_ACK: 通知 Python；sendState 供 Python 超时后主动查询。
+    // 没有用户消息选择器时只能看输入框：必须先见到输入框有内容（鼠标键盘发送时监听早于粘贴），清空才算发出
+    function watch(token, input) {
+        if (!token) {
+            return;
+        }
+        var userSelector = adapter.user_message;
+        var countUserMessages = function() {
+            return userSelector ? document.querySelectorAll(userSelector).length : 0;
+        };
+        var state = {before: countUserMessages(), acked: false, started: Date.now(), filled: false};
+        state.read = function() {
+            var empty = readInput(input).trim() === '';
+            if (!empty) {
+                state.filled = true;
+            }
+            return {
+                found: document.contains(input),
+                empty: empty,
+                newMessage: userSelector ? countUserMessages() > state.before : empty && state.filled
+            };
+        };
+        state.read();
+        var check = function() {
+            if (state.acked) {
+                return true;
+            }
+            var current = state.read();
+            if (current.empty && current.newMessage) {
+                state.acked = true;
+                var payload = JSON.stringify({token: token, ms: Date.now() - state.started});
+                notify('sendAck', [payload], function() { console.log('SEND_ACK:' + payload); });
+                return true;
+            }
+            return false;
+        };
+        if (sends[token] && sends[token].observer) {
+            sends[token].observer.disconnect();
+        }
+        var observer = new MutationObserver(function() {
+            if (check()) {
+                observer.disconnect();
+            }
+        });
+        observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+        input.addEventListener('input', check);
+        setTimeout(function() { observer.disconnect(); }, 60000);
+        state.observer = observer;
+        sends[token] = state;
+    }
+
+    // 回复捕获：发送后观察新增的回复节点，按增量把文本片段推送给 Python。
+    // 片段带有偏移量，页面重新渲染改写了前文时 Python 端从该偏移处截断再追加；
+    // 一段时间没有变化且“停止生成”按钮消失后视为回复完成
+    var activeReply = null;
+
+    function watchReply(token) {
+        if (!token || !adapter.reply) {
+            return;
+        }
+        if (activeReply && activeReply.token === token) {
+            // 重发同一个提示词时沿用已有的观察，否则两个观察者会从不同基准推送同一 token 的片段
+            return;
+        }
+        if (activeReply) {
+            activeReply.finish();
+        }
+        var before = document.querySelectorAll(adapter.reply).length;
+        var idleMs = adapter.reply_idle_ms || 3000;
+        var sent = '';
+        var finished = false;
+        var scheduled = false;
+        var idleTimer = null;
+        var giveUpTimer = null;
+        var observer = null;
+        var finish = function() {
+            if (finished) {
+                return;
+            }
+            finished = true;
+            observer.disconnect();
+            clearTimeout(idleTimer);
+            clearTimeout(giveUpTimer);
+            if (activeReply && activeReply.token === token) {
+                activeReply = null;
+            }
+            notify('replyDone', [token, sent], function() { console.log('AI_REPLY:' + sent); });
+        };
+        var checkIdle = function() {
+            if (adapter.streaming && document.querySelector(adapter.streaming)) {
+                // 仍在生成
+                idleTimer = setTimeout(checkIdle, idleMs);
+                return;
+            }
+            finish();
+        };
+        var scan = function() {
+            scheduled = false;
+            if (finished) {
+                return;
+            }
+            var nodes = document.querySelectorAll(adapter.reply);
+            if (nodes.length <= before) {
+                return;
+            }
+            var text = nodes[nodes.length - 1].innerText || '';
+            if (text === sent) {
+                return;
+            }
+            var offset = 0;
+            var limit = Math.min(text.length, sent.length);
+            while (offset < limit && text.charCodeAt(offset) === sent.charCodeAt(offset)) {
+                offset++;
+            }
+            sent = text;
+            notify('replyChunk', [token, offset, text.slice(offset)], null);
+            clearTimeout(idleTimer);
+            idleTimer = setTimeout(checkIdle, idleMs);
+        };
+        observer = new MutationObserver(function() {
+            if (!scheduled) {
+                scheduled = true;
+                setTimeout(scan, 100);
+            }
+        });
+        observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+        giveUpTimer = setTimeout(finish, adapter.reply_timeout_ms || 600000);
+        activeReply = {token: token, finish: finish};
+    }
+
+    window.__supperai = {
+        adapter: adapter.name,
+        notify: notify,
+        send: function(text, token) {
+            var input = findInput();
+            if (!input) {
+                return '未找到输入框';
+            }
+            setInput(input, text);
+            watch(token, input);
+            watchReply(token);
+            setTimeout(function() { submit(input); }, adapter.submit_delay_ms || 0);
+            return 'success';
+        },
+        watch: function(token) {
+            var input = findInput();
+            if (input) {
+                watch(token, input);
+            }
+            watchReply(token);
+        },
+        sendState: function(token) {
+            var state = sends[token];
+            return state ? state.read() : null;
+        }
+    };
+})();
+"""
+
+
+class SiteAdapter:
+    # 单个站点的适配定义，字段与 sites/*.json 一致
+    def __init__(self, data):
+        self.data = data
+        self.name = data.get('name', '')
+        self.domains = data.get('domains', [])
+        self.input = data.get('input', 'textarea')
+        self.user_message = data.get('user_message')
+        self.reply = data.get('reply')
+
+    def matches(self, domain):
+        return any(d in domain for d in self.domains)
+
+    def is_default(self):
+        return not self.domains
+
+    def watches_reply(self):
+        # 没有配置回复选择器的站点（如默认适配器）页面不会回传回复
+        return bool(self.reply)
+
+
+class SiteAdapterRegistry:
+    def __init__(self, sites_dir):
+        self.sites_dir = sites_dir
+        self.adapters = None
+        self.runtime_source = None
+        self.webchannel_source = None
+
+    def load(self):
+        self.adapters = []
+        if os.path.isdir(self.sites_dir):
+            for file_name in sorted(os.listdir(self.sites_dir)):
+                if not file_name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.sites_dir, file_name), 'r', encoding='utf-8') as f:
+                        self.adapters.append(SiteAdapter(json.load(f)))
+                except (OSError, ValueError) as e:
+                    print(f"站点适配文件 {file_name} 加载失败：{e}")
+        if not any(a.is_default() for a in self.adapters):
+            self.adapters.append(SiteAdapter({'name': '默认', 'domains': [], 'input': 'textarea',
+                                              'input_mode': 'value', 'submit': 'button',
+                                              'send_button': ['button[type="submit"], button.send'],
+                                              'enter_fallback': True, 'submit_delay_ms': 500}))
+        # 运行时脚本只生成一次，所有页面共用
+        adapters_js = json.dumps([a.data for a in self.adapters], ensure_ascii=False)
+        self.runtime_source = SUPPERAI_RUNTIME_JS.replace('__SUPPERAI_ADAPTERS__', adapters_js)
+        # qwebchannel.js 随 QtWebChannel 模块以资源形式提供
+        self.webchannel_source = ''
+        qwebchannel_file = QFile(':/qtwebchannel/qwebchannel.js')
+        if qwebchannel_file.open(QIODevice.ReadOnly):
+            self.webchannel_source = bytes(qwebchannel_file.readAll()).decode('utf-8')
+            qwebchannel_file.close()
+
+    def ensure_loaded(self):
+        if self.adapters is None:
+            self.load()
+
+    def adapter_for(self, domain):
+        self.ensure_loaded()
+        for adapter in self.adapters:
+            if not adapter.is_default() and adapter.matches(domain):
+                return adapter
+        return next(a for a in self.adapters if a.is_default())
+
+    def runtime_script(self):
+        self.ensure_loaded()
+        return self.runtime_source
+
+    def install(self, page):
+        with PROFILER.span('site_adapters_load'):
+            self.ensure_loaded()
+        if self.webchannel_source:
+            channel_script = QWebEngineScript()
+            channel_script.setName('supperai-qwebchannel')
+            channel_script.setSourceCode(self.webchannel_source)
+            channel_script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+            channel_script.setWorldId(QWebEngineScript.MainWorld)
+            channel_script.setRunsOnSubFrames(False)
+            page.scripts().insert(channel_script)
+        script = QWebEngineScript()
+        script.setName('supperai-runtime')
+        script.setSourceCode(self.runtime_script())
+        script.setInjectionPoint(QWebEngineScript.DocumentReady)
+        script.setWorldId(QWebEngineScript.MainWorld)
+        script.setRunsOnSubFrames(False)
+        page.scripts().insert(script)
+
+
+SITE_ADAPTERS = SiteAdapterRegistry(SITES_DIR)
+
+
+class PageBridge(QObject):
+    # 页面通过 QWebChannel 调用的对象（页面中名为 supperai），转发给页面所属的平台
+    def __init__(self, page):
+        super().__init__(page)
+        self.page = page
+
+    @pyqtSlot(str)
+    def sendAck(self, payload):
+        try:
+            self.page.ai_platform.handle_send_ack(json.loads(payload))
+        except ValueError:
+            pass
 
-class CustomWebEnginePage(QWebEnginePage):
-    # 保持不变
-    def __init__(self, *args, ai_platform=None, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.ai_platform = ai_platform
+    @pyqtSlot(str, int, str)
+    def replyChunk(self, token, offset, text):
+        self.page.ai_platform.handle_reply_chunk(token, offset, text)
 
-    def certificateError(self, error):
-        # 忽略证书错误
-        error.ignoreCertificateError()
-        return True
+    @pyqtSlot(str, str)
+    def replyDone(self, token, text):
+        self.page.ai_platform.handle_reply_done(token, text)
 
-    def javaScriptConsoleMessage(self, level, message, lineNumber, sourceID):
-        # 捕获控制台消息，可以用于获取 AI 平台的回复内容
-        if "AI_REPLY:" in message:
-            reply_content = message.replace("AI_REPLY:", "")
-            self.ai_platform.handle_ai_reply(reply_content)
+    @pyqtSlot(str)
+    def highlightsAnchored(self, ids):
+        try:
+            self.page.ai_platform.handle_highlights_anchored(json.loads(ids))
+        except ValueError:
+            pass
 
 
-class AIPlatform(QWidget):
-    def __init__(self, name, url, profile_manager, common_urls, window_index, config, main_window, parent=None):
-        super(AIPlatform, self).__init__(parent)
-        self.name = name
-        self.url = url
-        self.profile_manager = profile_manager
-        self.common_urls = common_urls
+class ReplyStream(QObject):
+    # 单个平台对一次发送的回复：收集增量片段，触发首字和完成事件
+    first_token = pyqtSignal(object)
+    chunk_received = pyqtSignal(object, str)
+    done = pyqtSignal(object)
+
+    def __init__(self, platform_name, prompt, token, parent=None, result=None):
+        super().__init__(parent)
+        self.platform_name = platform_name
+        self.prompt = prompt
+        self.token = token
+        self.result = result  # 对应的 SendResult，用于把回复归入所属的群发
+        self.parts = []
+        self.length = 0
+        self.sent_at = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+
+    def apply_chunk(self, offset, text):
+        if self.finished_at is not None:
+            return
+        if offset == self.length:
+            self.parts.append(text)
+            self.length += len(text)
+        else:
+            # 页面改写了前文，从偏移处截断后再追加
+            full_text = self.text()[:offset] + text
+            self.parts = [full_text]
+            self.length = len(full_text)
+        if self.first_token_at is None and self.length > 0:
+            self.first_token_at = time.time()
+            self.first_token.emit(self)
+        self.chunk_received.emit(self, text)
+
+    def finish(self, full_text=None):
+        if self.finished_at is not None:
+            return
+        if full_text is not None and len(full_text) != self.length:
+            self.parts = [full_text]
+            self.length = len(full_text)
+        if self.first_token_at is None and self.length > 0:
+            self.first_token_at = time.time()
+            self.first_token.emit(self)
+        self.finished_at = time.time()
+        self.done.emit(self)
+
+    def is_finished(self):
+        return self.finished_at is not None
+
+    def text(self):
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ''
+
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.sent_at
+
+    def total_time(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.sent_at
+
+
+class RollingHistogram:
+    # 最近 N 个样本的滚动统计，直方图按固定分桶边界计数
+    def __init__(self, edges, size=200):
+        self.edges = edges
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        if value is not None and value >= 0:
+            self.samples.append(value)
+
+    def count(self):
+        return len(self.samples)
+
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def buckets(self):
+        # [(上界, 数量)]，最后一个桶的上界为 None（大于最后一个边界）
+        counts = [0] * (len(self.edges) + 1)
+        for value in self.samples:
+            index = 0
+            while index < len(self.edges) and value > self.edges[index]:
+                index += 1
+            counts[index] += 1
+        return list(zip(self.edges + [None], counts))
+
+
+class PlatformMetrics(QObject):
+    # 单个平台的响应速度统计：发送到页面确认的延迟、首字时间、总生成时间和每秒字数
+    updated = pyqtSignal()
+    SECOND_EDGES = [0.5, 1, 2, 5, 10, 20, 60]
+    CPS_EDGES = [5, 10, 20, 50, 100, 200]
+    LABELS = {'ack': '发送确认', 'ttft': '首字时间', 'total': '总生成时间', 'cps': '字/秒'}
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.histograms = {
+            'ack': RollingHistogram(self.SECOND_EDGES),
+            'ttft': RollingHistogram(self.SECOND_EDGES),
+            'total': RollingHistogram(self.SECOND_EDGES),
+            'cps': RollingHistogram(self.CPS_EDGES),
+        }
+
+    def record_ack(self, seconds):
+        self.histograms['ack'].add(seconds)
+        self.updated.emit()
+
+    def add_reply_sample(self, ttft, total_time, length):
+        self.histograms['ttft'].add(ttft)
+        self.histograms['total'].add(total_time)
+        # 每秒字数按首字之后的生成时间计算
+        generation = total_time - ttft if ttft is not None and total_time is not None else total_time
+        if generation and generation > 0 and length:
+            self.histograms['cps'].add(length / generation)
+
+    def record_reply(self, ttft, total_time, length):
+        self.add_reply_sample(ttft, total_time, length)
+        self.updated.emit()
+
+    def load_history(self, rows):
+        # rows: 数据库中最近的回复 (首字时间, 总时间, 字数)，从旧到新
+        for ttft, total_time, length in rows:
+            self.add_reply_sample(ttft, total_time, length)
+
+    def summary_text(self):
+        ttft = self.histograms['ttft'].percentile(50)
+        cps = self.histograms['cps'].percentile(50)
+        if ttft is None:
+            return "暂无统计"
+        text = f"首字 {ttft:.1f}s"
+        if cps is not None:
+            text += f" · {cps:.0f}字/s"
+        return text
+
+
+class SentenceChunker:
+    # 把流式到达的回复切成句子：只扫描新到达的字符，已切出的句子不再处理
+    TERMINATORS = '。！？；!?;\n'
+
+    def __init__(self):
+        self.pending = ''
+        self.scan_pos = 0
+
+    def feed(self, text):
+        self.pending += text
+        sentences = []
+        start = 0
+        i = self.scan_pos
+        while i < len(self.pending):
+            char = self.pending[i]
+            boundary = char in self.TERMINATORS
+            if char == '.':
+                # 英文句号后面是空白才算句末，末尾的句号等下一个字符到达再判断
+                if i + 1 >= len(self.pending):
+                    break
+                boundary = self.pending[i + 1].isspace()
+            if boundary:
+                sentences.append(self.pending[start:i + 1])
+                start = i + 1
+            i += 1
+        self.pending = self.pending[start:]
+        self.scan_pos = i - start
+        return sentences
+
+    def flush(self):
+        rest, self.pending, self.scan_pos = self.pending, '', 0
+        return [rest] if rest else []
+
+
+def sentence_key(sentence):
+    # 句子比较用的键：去掉空白和标点并转小写，太短的句子不参与比较
+    key = ''.join(c for c in sentence.lower() if c.isalnum())
+    return hash(key) if len(key) >= ReplyComparison.MIN_SENTENCE else None
+
+
+class ReplyComparison:
+    # 多个回复之间的增量相似度：每个句子按哈希计入，新句子只需与持有同一哈希的回复比较，
+    # 总计算量与句子数成线性。两两相似度 = 2 × 共同句子数 / (两者句子数之和)
+    MIN_SENTENCE = 4
+
+    def __init__(self):
+        self.sizes = {}  # 回复 -> 参与比较的句子数
+        self.owners = {}  # 句子哈希 -> {回复: 出现次数}
+        self.shared = {}  # (回复a, 回复b) -> 共同句子数
+
+    def add_sentence(self, key, sentence_hash):
+        # 返回因这个句子而首次变为“共同”的其他回复，调用方据此更新它们中该句的显示
+        self.sizes[key] = self.sizes.get(key, 0)
+        if sentence_hash is None:
+            return []
+        self.sizes[key] += 1
+        holders = self.owners.setdefault(sentence_hash, {})
+        mine = holders.get(key, 0)
+        for other, count in holders.items():
+            if other != key and count > mine:
+                pair = tuple(sorted((key, other)))
+                self.shared[pair] = self.shared.get(pair, 0) + 1
+        holders[key] = mine + 1
+        if mine == 0 and len(holders) == 2:
+            return [other for other in holders if other != key]
+        return []
+
+    def remove_sentence(self, key, sentence_hash):
+        # add_sentence 的逆操作；返回因此不再与其他回复共有这个句子的回复
+        if sentence_hash is None:
+            return []
+        self.sizes[key] -= 1
+        holders = self.owners[sentence_hash]
+        mine = holders[key]
+        for other, count in holders.items():
+            if other != key and count >= mine:
+                pair = tuple(sorted((key, other)))
+                self.shared[pair] -= 1
+        if mine > 1:
+            holders[key] = mine - 1
+            return []
+        del holders[key]
+        if not holders:
+            del self.owners[sentence_hash]
+        return list(holders) if len(holders) == 1 else []
+
+    def is_shared(self, sentence_hash):
+        return sentence_hash is not None and len(self.owners.get(sentence_hash, ())) >= 2
+
+    def similarity(self, a, b):
+        total = self.sizes.get(a, 0) + self.sizes.get(b, 0)
+        if total == 0:
+            return None
+        return 2 * self.shared.get(tuple(sorted((a, b))), 0) / total
+
+
+class ComparisonColumn(QWidget):
+    # 对比面板中的一列：一个平台的回复，共同句子以底色标出。句子追加和改色都只操作对应的文本区间
+    SHARED_COLOR = QColor('#d8f5d0')
+
+    def __init__(self, reply_stream, parent=None):
+        super().__init__(parent)
+        self.reply_stream = reply_stream
+        self.chunker = SentenceChunker()
+        self.fed = 0
+        self.ranges = {}  # 句子哈希 -> [(起始位置, 结束位置)]
+        self.sentences = []  # (句子, 句子哈希, 句末在回复中的偏移)，按顺序
+        self.tail_start = 0
+        layout = QVBoxLayout()
+        layout.setContentsMargins(2, 2, 2, 2)
+        self.header = QLabel(reply_stream.platform_name)
+        self.text_edit = QTextEdit()
+        self.text_edit.setReadOnly(True)
+        layout.addWidget(self.header)
+        layout.addWidget(self.text_edit)
+        self.setLayout(layout)
+
+    def append_sentence(self, sentence, sentence_hash, shared):
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self.tail_start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        start = cursor.position()
+        cursor.insertText(sentence, self.sentence_format(shared))
+        self.ranges.setdefault(sentence_hash, []).append((start, cursor.position()))
+        consumed = self.sentences[-1][2] if self.sentences else 0
+        self.sentences.append((sentence, sentence_hash, consumed + len(sentence)))
+        self.tail_start = cursor.position()
+
+    def rewind(self, offset):
+        # 回退到 offset 之前最后一个句末：删掉其后的句子和文本，返回被删句子的哈希（从后往前）
+        removed = []
+        while self.sentences and self.sentences[-1][2] > offset:
+            _, sentence_hash, _ = self.sentences.pop()
+            start, _ = self.ranges[sentence_hash].pop()
+            if not self.ranges[sentence_hash]:
+                del self.ranges[sentence_hash]
+            self.tail_start = start
+            removed.append(sentence_hash)
+        if not self.sentences:
+            self.tail_start = 0
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self.tail_start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self.chunker = SentenceChunker()
+        self.fed = self.sentences[-1][2] if self.sentences else 0
+        return removed
+
+    def fed_text(self):
+        return ''.join(sentence for sentence, _, _ in self.sentences) + self.chunker.pending
+
+    def set_tail(self, text):
+        # 尚未结束的半句，随新片段替换
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self.tail_start)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.insertText(text, self.sentence_format(False))
+
+    def mark_shared(self, sentence_hash, shared=True):
+        for start, end in self.ranges.get(sentence_hash, ()):
+            cursor = QTextCursor(self.text_edit.document())
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            cursor.setCharFormat(self.sentence_format(shared))
+
+    def sentence_format(self, shared):
+        fmt = QTextCharFormat()
+        if shared:
+            fmt.setBackground(self.SHARED_COLOR)
+        return fmt
+
+
+class ReplyComparisonPanel(QWidget):
+    # 回复对比面板：同一次群发在各平台的回复并排显示，随流式片段增量切句、比较和着色；
+    # 每次群发开始新的一轮，回复按 SendResult 归入所属的群发
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("回复对比")
+        self.resize(1200, 700)
+        self.prompt = None
+        self.broadcast = None
+        self.columns = {}  # token -> ComparisonColumn
+        self.comparison = ReplyComparison()
+        layout = QVBoxLayout()
+        self.summary_label = QLabel("发送提示词后，这里并排显示各平台的回复，相同的句子以绿色底色标出。")
+        self.summary_label.setWordWrap(True)
+        self.splitter = QSplitter(Qt.Horizontal)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.splitter)
+        self.setLayout(layout)
+        # 相似度文字按固定间隔刷新，不随每个片段刷新
+        self.summary_timer = QTimer(self)
+        self.summary_timer.setSingleShot(True)
+        self.summary_timer.setInterval(250)
+        self.summary_timer.timeout.connect(self.update_summary)
+
+    def add_stream(self, reply_stream):
+        # 只收本轮群发的回复；单独发送或上一轮迟到的回复不加入
+        if self.broadcast is None or reply_stream.result is None or not any(
+                result is reply_stream.result for result in self.broadcast.results.values()):
+            return
+        column = ComparisonColumn(reply_stream)
+        self.columns[reply_stream.token] = column
+        self.splitter.addWidget(column)
+        reply_stream.chunk_received.connect(self.on_chunk)
+        reply_stream.done.connect(self.on_done)
+
+    def start_round(self, broadcast):
+        self.broadcast = broadcast
+        self.prompt = broadcast.prompt
+        for column in self.columns.values():
+            column.setParent(None)
+            column.deleteLater()
+        self.columns = {}
+        self.comparison = ReplyComparison()
+        self.update_summary()
+
+    def on_chunk(self, reply_stream, text):
+        column = self.columns.get(reply_stream.token)
+        if column is None:
+            return
+        offset = reply_stream.length - len(text)
+        if offset != column.fed:
+            # 页面改写了已输出的内容（如 Markdown 渲染改写末尾几个字符）：只回退这一列到改写处之前的句末
+            self.rewind(column, offset)
+            text = reply_stream.text()[column.fed:]
+        self.feed(column, column.chunker.feed(text), len(text))
+
+    def on_done(self, reply_stream):
+        column = self.columns.get(reply_stream.token)
+        if column is None:
+            return
+        if reply_stream.length != column.fed:
+            # 完整文本与已切分的内容不一致时，从两者的公共前缀处回退
+            full_text = reply_stream.text()
+            fed_text = column.fed_text()
+            common = 0
+            while common < min(len(full_text), len(fed_text)) and full_text[common] == fed_text[common]:
+                common += 1
+            self.rewind(column, common)
+            rest = full_text[column.fed:]
+            self.feed(column, column.chunker.feed(rest), len(rest))
+        self.feed(column, column.chunker.flush(), 0)
+
+    def feed(self, column, sentences, length):
+        column.fed += length
+        token = column.reply_stream.token
+        for sentence in sentences:
+            sentence_hash = sentence_key(sentence)
+            for other in self.comparison.add_sentence(token, sentence_hash):
+                self.columns[other].mark_shared(sentence_hash)
+            column.append_sentence(sentence, sentence_hash, self.comparison.is_shared(sentence_hash))
+        column.set_tail(column.chunker.pending)
+        self.summary_timer.start()
+
+    def rewind(self, column, offset):
+        token = column.reply_stream.token
+        for sentence_hash in column.rewind(offset):
+            for other in self.comparison.remove_sentence(token, sentence_hash):
+                if other in self.columns:
+                    self.columns[other].mark_shared(sentence_hash, False)
+
+    def update_summary(self):
+        if not self.columns:
+            return
+        tokens = list(self.columns)
+        lines = [f"提示词：{self.prompt[:80]}"]
+        for token in tokens:
+            column = self.columns[token]
+            scores = [self.comparison.similarity(token, other) for other in tokens if other != token]
+            scores = [score for score in scores if score is not None]
+            average = f"{sum(scores) / len(scores):.0%}" if scores else '-'
+            state = '' if column.reply_stream.is_finished() else '（生成中）'
+            column.header.setText(f"{column.reply_stream.platform_name}{state} · 与其他回复平均相似度 {average}")
+        pairs = []
+        for i, a in enumerate(tokens):
+            for b in tokens[i + 1:]:
+                score = self.comparison.similarity(a, b)
+                if score is not None:
+                    pairs.append(f"{self.columns[a].reply_stream.platform_name}/"
+                                 f"{self.columns[b].reply_stream.platform_name} {score:.0%}")
+        if pairs:
+            lines.append('两两相似度：' + '，'.join(pairs))
+        self.summary_label.setText('\n'.join(lines))
+
+
+class MetricsDialog(QDialog):
+    # 平台统计面板：各指标的样本数、均值、分位数和直方图
+    def __init__(self, metrics, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.setWindowTitle(f"{metrics.name} 响应速度统计")
+        self.resize(520, 360)
+        layout = QVBoxLayout()
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["指标", "样本", "均值", "P50", "P90", "分布"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+        metrics.updated.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        self.table.setRowCount(len(self.metrics.histograms))
+        for row, (key, histogram) in enumerate(self.metrics.histograms.items()):
+            unit = '' if key == 'cps' else 's'
+            values = [histogram.mean(), histogram.percentile(50), histogram.percentile(90)]
+            cells = [PlatformMetrics.LABELS[key], str(histogram.count())]
+            cells += ['-' if v is None else f"{v:.1f}{unit}" for v in values]
+            cells.append('  '.join(f"{'≤' + str(edge) if edge is not None else '>'}{unit}:{count}"
+                                   for edge, count in histogram.buckets() if count))
+            for column, text in enumerate(cells):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+
+class SendConfirmation(QObject):
+    # 等待页面确认一次发送（输入框已清空且出现新的用户消息节点）。
+    # 未收到确认时按有界指数退避查询输入框：仍有内容说明没发出去才重发，
+    # 已清空但消息未出现说明站点较慢，只继续等待
+    BASE_DELAY_MS = 500
+    MAX_DELAY_MS = 8000
+    MAX_CHECKS = 5
+    MAX_RESENDS = 2
+
+    def __init__(self, ai_platform, prompt, result, token):
+        super().__init__(ai_platform)
+        self.ai_platform = ai_platform
+        self.prompt = prompt
+        self.result = result
+        self.token = token
+        self.checks = 0
+        self.resends = 0
+        self.created_at = time.time()  # 开始发送的时间，用于统计确认延迟
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.on_timeout)
+
+    def start(self):
+        self.timer.start(min(self.BASE_DELAY_MS * (2 ** self.checks), self.MAX_DELAY_MS))
+
+    def acknowledge(self):
+        self.timer.stop()
+        self.result.mark(SendResult.CONFIRMED)
+        self.ai_platform.finish_confirmation(self)
+
+    def fail(self, error):
+        self.timer.stop()
+        self.result.mark(SendResult.FAILED, error)
+        self.ai_platform.finish_confirmation(self)
+
+    def on_timeout(self):
+        if self.result.is_settled():
+            self.ai_platform.finish_confirmation(self)
+            return
+        self.checks += 1
+        if self.checks > self.MAX_CHECKS:
+            self.fail("未收到发送确认")
+            return
+        self.ai_platform.query_send_state(self.token, self.on_send_state)
+
+    def on_send_state(self, state):
+        if self.result.is_settled():
+            return
+        if state and state.get('empty') and state.get('newMessage'):
+            self.acknowledge()
+        elif state and state.get('found') and not state.get('empty') and self.resends < self.MAX_RESENDS:
+            # 输入框仍保留提示词，说明发送按钮/回车没有生效
+            self.resends += 1
+            print(f"{self.ai_platform.name} 未确认发送，第 {self.resends} 次重发")
+            self.ai_platform.resend(self)
+            self.start()
+        else:
+            self.start()
+
+
+class PromptSendQueue(QObject):
+    # 单个平台的发送队列：同一时间只有一个提示词在发送或等待回复，回复完成（或失败、超时）后才发送下一个；
+    # 发送间隔受 config.json 中 rate_limits 的限制（min_interval_s 最小间隔，per_minute 每分钟上限）。
+    # 队列长度超过上限时新提示词直接记为失败，避免无限堆积
+    depth_changed = pyqtSignal(int)
+
+    def __init__(self, ai_platform, limits=None, max_depth=100, reply_timeout_s=300):
+        super().__init__(ai_platform)
+        self.ai_platform = ai_platform
+        limits = limits or {}
+        self.min_interval = float(limits.get('min_interval_s', 0))
+        self.per_minute = int(limits.get('per_minute', 0))
+        self.max_depth = max_depth
+        self.items = deque()  # (提示词, SendResult)
+        self.in_flight = None  # 正在发送的 token
+        self.sent_times = deque()  # 最近一分钟内的发送时间
+        self.rate_timer = QTimer(self)
+        self.rate_timer.setSingleShot(True)
+        self.rate_timer.timeout.connect(self.pump)
+        # 回复一直没有完成时不能让队列永远停住
+        self.reply_timer = QTimer(self)
+        self.reply_timer.setSingleShot(True)
+        self.reply_timer.setInterval(int(reply_timeout_s * 1000))
+        self.reply_timer.timeout.connect(self.on_reply_timeout)
+
+    def depth(self):
+        return len(self.items) + (1 if self.in_flight else 0)
+
+    def enqueue(self, prompt, result):
+        if len(self.items) >= self.max_depth:
+            result.mark(SendResult.FAILED, "发送队列已满")
+            return
+        self.items.append((prompt, result))
+        self.depth_changed.emit(self.depth())
+        self.pump()
+
+    def delay_ms(self):
+        # 距离允许下一次发送还需等待的毫秒数
+        now = time.time()
+        while self.sent_times and now - self.sent_times[0] >= 60:
+            self.sent_times.popleft()
+        wait = 0.0
+        if self.min_interval and self.sent_times:
+            wait = self.sent_times[-1] + self.min_interval - now
+        if self.per_minute and len(self.sent_times) >= self.per_minute:
+            wait = max(wait, self.sent_times[0] + 60 - now)
+        return max(0, int(wait * 1000))
+
+    def pump(self):
+        if self.in_flight or not self.items or not self.ai_platform.is_page_loaded:
+            return
+        wait = self.delay_ms()
+        if wait > 0:
+            self.rate_timer.start(wait)
+            return
+        prompt, result = self.items.popleft()
+        if result.is_settled():
+            self.depth_changed.emit(self.depth())
+            self.pump()
+            return
+        token = self.ai_platform.next_token()
+        self.in_flight = token
+        self.sent_times.append(time.time())
+        self.reply_timer.start()
+        self.depth_changed.emit(self.depth())
+        if self.ai_platform.send_method == 'javascript':
+            self.ai_platform.start_send(prompt, result, token)
+        else:
+            # 鼠标键盘发送和其他平台共用一个队列，避免抢占鼠标
+            self.ai_platform.main_window.dispatcher.queue_mouse_job(
+                self.ai_platform, prompt, result, partial(self.ai_platform.start_send, prompt, result, token))
+
+    def release(self, token):
+        # 当前提示词的回复已完成或发送失败，继续发送下一个
+        if token is None or token != self.in_flight:
+            return
+        self.in_flight = None
+        self.reply_timer.stop()
+        self.depth_changed.emit(self.depth())
+        QTimer.singleShot(0, self.pump)
+
+    def on_reply_timeout(self):
+        token = self.in_flight
+        print(f"{self.ai_platform.name} 等待回复超时，继续发送下一个提示词")
+        self.ai_platform.reply_streams.pop(token, None)
+        self.release(token)
+
+    def clear(self, error):
+        for _, result in self.items:
+            result.mark(SendResult.FAILED, error)
+        self.items.clear()
+        self.in_flight = None
+        self.reply_timer.stop()
+        self.rate_timer.stop()
+        self.depth_changed.emit(0)
+
+
+class CustomWebEnginePage(QWebEnginePage):
+    # 保持不变
+    def __init__(self, *args, ai_platform=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ai_platform = ai_platform
+        # 注入站点适配运行时，之后每次发送只需调用 window.__supperai.send
+        SITE_ADAPTERS.install(self)
+        highlight_script = QWebEngineScript()
+        highlight_script.setName('supperai-highlight')
+        highlight_script.setSourceCode(HIGHLIGHT_JS)
+        highlight_script.setInjectionPoint(QWebEngineScript.DocumentReady)
+        highlight_script.setWorldId(QWebEngineScript.MainWorld)
+        highlight_script.setRunsOnSubFrames(False)
+        self.scripts().insert(highlight_script)
+        # 回复片段和发送确认通过 QWebChannel 回传
+        self.bridge = PageBridge(self)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject('supperai', self.bridge)
+        self.setWebChannel(self.channel)
+
+    def certificateError(self, error):
+        # 忽略证书错误
+        error.ignoreCertificateError()
+        return True
+
+    def javaScriptConsoleMessage(self, level, message, lineNumber, sourceID):
+        # 捕获控制台消息，可以用于获取 AI 平台的回复内容
+        if message.startswith("SEND_ACK:"):
+            try:
+                payload = json.loads(message[len("SEND_ACK:"):])
+            except ValueError:
+                return
+            self.ai_platform.handle_send_ack(payload)
+        elif "AI_REPLY:" in message:
+            reply_content = message.replace("AI_REPLY:", "")
+            self.ai_platform.handle_ai_reply(reply_content)
+
+
+class AIPlatform(QWidget):
+    reply_stream_started = pyqtSignal(object)
+
+    def __init__(self, name, url, profile_manager, common_urls, window_index, config, main_window,
+                 initial_url=None, parent=None):
+        super(AIPlatform, self).__init__(parent)
+        self.name = name
+        self.url = url
+        self.initial_url = initial_url  # 恢复历史对话时打开的地址，优先于配置中的地址
+        self.profile_manager = profile_manager
+        self.common_urls = common_urls
         self.window_index = window_index  # 窗口索引，从1开始
         self.config = config
         self.main_window = main_window
         self.is_page_loaded = False
-        self.pending_prompts = []
+        rate_limits = config.get('rate_limits', {})
+        self.send_queue = PromptSendQueue(self, rate_limits.get(name, rate_limits.get('default')),
+                                          config.get('max_queue_depth', 100), config.get('reply_timeout_s', 300))
+        self.confirmations = {}  # token -> SendConfirmation
+        self.reply_streams = {}  # token -> ReplyStream
+        self.send_counter = 0
         self.current_highlight_color = 'yellow'  # 默认划线颜色
+        self.start_url = url  # 平台起始页，上面的划线不落盘
+        self.anchored_highlights = set()  # 页面报告已显示的划线 id
         self.zoom_factor = 1.0  # 默认缩放比例
         self.initUI()
 
@@ -1082,13 +3762,11 @@ class AIPlatform(QWidget):
         self.profile = self.profile_manager.get_profile(domain)
         self.page = CustomWebEnginePage(self.profile, self.browser, ai_platform=self)
         self.browser.setPage(self.page)
-        self.browser.load(QUrl(self.url))
+        self.browser.loadStarted.connect(self.on_load_started)
         self.browser.loadFinished.connect(self.on_load_finished)
         self.browser.urlChanged.connect(self.update_address_bar)
-
-        # 设置浏览器的 User-Agent 为最新的 Chrome
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-        self.profile.setHttpUserAgent(user_agent)
+        # 单页应用切换对话时只改变网址、不触发 loadFinished，稍后按新网址恢复划线
+        self.browser.urlChanged.connect(lambda _: QTimer.singleShot(1000, self.anchor_highlights))
 
         # 初始缩放比例
         self.browser.setZoomFactor(self.zoom_factor)
@@ -1111,9 +3789,25 @@ class AIPlatform(QWidget):
         self.clear_highlights_btn = QPushButton("清除划线")
         self.clear_highlights_btn.clicked.connect(self.clear_highlights)
 
+        # 发送队列长度，没有排队时隐藏
+        self.queue_label = QLabel()
+        self.queue_label.setToolTip("正在发送或等待回复的提示词数量")
+        self.queue_label.hide()
+        self.send_queue.depth_changed.connect(self.update_queue_label)
+
+        # 响应速度统计，点击查看详细分布
+        self.metrics = self.main_window.metrics_for(self.name)
+        self.stats_btn = QToolButton()
+        self.stats_btn.setToolTip("首字时间和生成速度（中位数），点击查看详细统计")
+        self.stats_btn.clicked.connect(self.show_metrics)
+        self.metrics.updated.connect(self.update_stats_btn)
+        self.update_stats_btn()
+
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
         btn_layout.addWidget(self.coordinate_btn)
+        btn_layout.addWidget(self.stats_btn)
+        btn_layout.addWidget(self.queue_label)
         btn_layout.addWidget(self.copy_highlights_btn)  # 替换为复制划线内容按钮
         btn_layout.addWidget(self.clear_highlights_btn)
         btn_layout.addStretch()
@@ -1129,6 +3823,23 @@ class AIPlatform(QWidget):
         self.browser.setContextMenuPolicy(Qt.CustomContextMenu)
         self.browser.customContextMenuRequested.connect(self.show_context_menu)
 
+    def start_loading(self):
+        # 坐标配置（含保存的地址）读取完毕后只加载一次页面，由启动调度器按顺序调用
+        if self.initial_url:
+            self.url = self.initial_url
+            self.address_bar.setText(self.url)
+        self.browser.load(QUrl(self.url))
+
+    def update_stats_btn(self):
+        self.stats_btn.setText(self.metrics.summary_text())
+
+    def show_metrics(self):
+        MetricsDialog(self.metrics, self).exec_()
+
+    def update_queue_label(self, depth):
+        self.queue_label.setText(f"队列 {depth}")
+        self.queue_label.setVisible(depth > 0)
+
     def update_address_bar(self, url):
         self.address_bar.setText(url.toString())
 
@@ -1144,19 +3855,9 @@ class AIPlatform(QWidget):
         self.get_highlighted_text(callback)
 
     def clear_highlights(self):
-        js_code = """
-        (function() {
-            var highlights = document.querySelectorAll('span.highlight');
-            highlights.forEach(function(span) {
-                var parent = span.parentNode;
-                while(span.firstChild) {
-                    parent.insertBefore(span.firstChild, span);
-                }
-                parent.removeChild(span);
-            });
-        })();
-        """
-        self.browser.page().runJavaScript(js_code)
+        self.main_window.highlights.clear(self.name, self.current_url(), self.anchored_highlights)
+        self.anchored_highlights = set()
+        self.browser.page().runJavaScript("window.__supperaiHL && window.__supperaiHL.removeAll();")
 
     def show_context_menu(self, position):
         menu = QMenu()
@@ -1184,65 +3885,55 @@ class AIPlatform(QWidget):
         menu.exec_(self.browser.mapToGlobal(position))
 
     def highlight_selection(self):
-        # 先移除选区内已有的高亮
-        js_remove_highlight = """
-        (function() {
-            var selection = window.getSelection();
-            if (!selection.isCollapsed) {
-                var range = selection.getRangeAt(0);
-                var contents = range.cloneContents();
-                var spans = contents.querySelectorAll('span.highlight');
-                spans.forEach(function(span) {
-                    var parent = span.parentNode;
-                    while(span.firstChild) {
-                        parent.insertBefore(span.firstChild, span);
-                    }
-                    parent.removeChild(span);
-                });
-            }
-        })();
-        """
-        self.browser.page().runJavaScript(js_remove_highlight, lambda _: self.apply_highlight())
+        # 划线的选择器由页面返回并写入划线索引，选区内原有的划线由新划线取代
+        highlight_id = uuid.uuid4().hex
+        url = self.current_url()
+        js_code = (f"window.__supperaiHL && window.__supperaiHL.capture("
+                   f"{json.dumps(highlight_id)}, {json.dumps(self.current_highlight_color)});")
+
+        def callback(result):
+            if not result:
+                return
+            if result.get('error'):
+                print(f"{self.name} 划线失败：{result['error']}")
+            for removed_id in result.get('removed') or []:
+                self.main_window.highlights.remove(removed_id)
+            if result.get('selectors'):
+                self.main_window.highlights.add(self.name, url, highlight_id, self.current_highlight_color,
+                                                result['selectors'],
+                                                persist=HighlightIndex.is_conversation_url(url, self.start_url))
 
-    def apply_highlight(self):
-        js_apply_highlight = f"""
-        (function() {{
-            var selection = window.getSelection();
-            if (!selection.isCollapsed) {{
-                var range = selection.getRangeAt(0);
-                var newNode = document.createElement('span');
-                newNode.style.backgroundColor = '{self.current_highlight_color}';
-                newNode.className = 'highlight';
-                try {{
-                    range.surroundContents(newNode);
-                }} catch(e) {{
-                    alert('无法应用高亮：' + e);
-                }}
-                selection.removeAllRanges();
-            }}
-        }})();
-        """
-        self.browser.page().runJavaScript(js_apply_highlight)
+        self.browser.page().runJavaScript(js_code, callback)
 
     def delete_current_highlight(self):
         js_code = """
         (function() {
-            var selection = window.getSelection();
-            if (!selection.isCollapsed) {
-                var range = selection.getRangeAt(0);
-                var node = range.startContainer.parentNode;
-                if (node && node.classList.contains('highlight')) {
-                    var parent = node.parentNode;
-                    while(node.firstChild) {
-                        parent.insertBefore(node.firstChild, node);
-                    }
-                    parent.removeChild(node);
-                }
-                selection.removeAllRanges();
+            if (!window.__supperaiHL) {
+                return null;
+            }
+            var id = window.__supperaiHL.idAtSelection();
+            if (id) {
+                window.__supperaiHL.remove(id);
             }
+            return id;
         })();
         """
-        self.browser.page().runJavaScript(js_code)
+
+        def callback(highlight_id):
+            if highlight_id:
+                self.main_window.highlights.remove(highlight_id)
+
+        self.browser.page().runJavaScript(js_code, callback)
+
+    def anchor_highlights(self):
+        # 按索引中的选择器把本网址的划线重新标到页面上；已标出的划线不会重复处理
+        # 没有保存的划线时也要调用，页面借此丢弃已不在文档中的划线
+        payload = self.main_window.highlights.anchor_payload(self.name, self.current_url())
+        self.browser.page().runJavaScript(
+            f"window.__supperaiHL && window.__supperaiHL.anchor({json.dumps(payload, ensure_ascii=False)});")
+
+    def handle_highlights_anchored(self, highlight_ids):
+        self.anchored_highlights = set(highlight_ids)
 
     def show_highlight_color_menu(self):
         menu = QMenu()
@@ -1294,24 +3985,151 @@ class AIPlatform(QWidget):
         self.is_page_loaded = False
         self.browser.load(QUrl(url))
 
-    def on_load_finished(self):
+    def current_url(self):
+        return self.browser.url().toString()
+
+    def fetch_title(self, callback):
+        self.browser.page().runJavaScript("document.title;", callback)
+
+    def open_url(self, url):
+        # 打开指定网址（如恢复历史对话），不影响坐标设置
+        self.url = url
+        self.address_bar.setText(url)
+        self.is_page_loaded = False
+        self.abandon_reply()
+        self.browser.load(QUrl(url))
+
+    def abandon_reply(self):
+        # 页面重新加载后，已确认发送的提示词的回复不会再回传，不必等到回复超时才继续发送
+        token = self.send_queue.in_flight
+        if token is None or token in self.confirmations:
+            return
+        if self.reply_streams.pop(token, None) is not None:
+            PROFILER.end(('first_token', token), state='abandoned')
+        self.send_queue.release(token)
+
+    def dispose(self):
+        # 从窗口池中移除时调用：结束等待中的发送，并显式释放页面和视图占用的渲染进程内存
+        for confirmation in list(self.confirmations.values()):
+            confirmation.fail("窗口已关闭")
+        self.send_queue.clear("窗口已关闭")
+        self.reply_streams.clear()
+        self.main_window.dispatcher.forget(self)
+        self.main_window.lifecycle.unregister(self.browser)
+        self.browser.stop()
+        self.page.deleteLater()
+        self.browser.deleteLater()
+        self.setParent(None)
+        self.deleteLater()
+
+    def is_busy(self):
+        return bool(self.send_queue.depth() or self.confirmations or self.reply_streams)
+
+    def on_load_started(self):
+        PROFILER.begin(('page_load', id(self)), 'page_load', platform=self.name, url=self.url)
+        # 任何重新加载（包括恢复被丢弃的页面）期间都不发送，等 loadFinished 后再继续
+        self.is_page_loaded = False
+        self.abandon_reply()
+        self.anchored_highlights = set()
+
+    def on_load_finished(self, ok=True):
+        PROFILER.end(('page_load', id(self)), ok=ok)
         self.is_page_loaded = True
-        # 注入划线标记的脚本
+        # 注入划线标记的脚本，并恢复本网址保存的划线
         self.inject_highlight_script()
+        self.anchor_highlights()
         # If there are pending prompts, send them
-        if self.pending_prompts:
-            prompt = self.pending_prompts.pop(0)
-            self.send_prompt(prompt)
+        # 页面加载完成后继续发送排队的提示词
+        self.send_queue.pump()
+
+    def send_prompt(self, prompt, result=None):
+        # 放入发送队列；页面加载完成且上一个回复结束后才真正发送
+        if result is None:
+            result = SendResult(self.name, prompt, self.send_method)
+        if self.main_window.lifecycle.activate(self.browser):
+            # 被丢弃的页面正在重新加载，loadStarted 可能稍后才到
+            self.is_page_loaded = False
+        self.send_queue.enqueue(prompt, result)
+        return result
+
+    def next_token(self):
+        self.send_counter += 1
+        return f"{self.window_index}-{self.send_counter}-{int(time.time() * 1000)}"
+
+    def watches_reply(self):
+        return SITE_ADAPTERS.adapter_for(QUrl(self.current_url()).host()).watches_reply()
+
+    def start_send(self, prompt, result, token):
+        confirmation = SendConfirmation(self, prompt, result, token)
+        self.confirmations[token] = confirmation
+        PROFILER.begin(('send_confirmation', token), 'send_confirmation', platform=self.name,
+                       method=self.send_method)
+        if self.watches_reply():
+            reply_stream = ReplyStream(self.name, prompt, token, result=result)
+            self.reply_streams[token] = reply_stream
+            PROFILER.begin(('first_token', token), 'first_token', platform=self.name)
+            reply_stream.first_token.connect(lambda stream: PROFILER.end(('first_token', stream.token)))
+            self.reply_stream_started.emit(reply_stream)
+        self.deliver(confirmation)
+        if result.is_settled():
+            self.finish_confirmation(confirmation)
+        else:
+            confirmation.start()
 
-    def send_prompt(self, prompt):
-        if not self.is_page_loaded:
-            # 页面未加载完成，等待加载完成后再发送
-            self.pending_prompts.append(prompt)
-            return
+    def deliver(self, confirmation):
+        if self.send_method == 'javascript':
+            self.execute_js(confirmation.prompt, confirmation.result, confirmation.token)
+        else:
+            self.send_prompt_with_pyautogui(confirmation.prompt, confirmation.result, confirmation.token)
+
+    def resend(self, confirmation):
         if self.send_method == 'javascript':
-            self.execute_js(prompt)
+            self.deliver(confirmation)
         else:
-            self.send_prompt_with_pyautogui(prompt)
+            # 鼠标键盘发送需要重新排队，避免和其他平台抢占鼠标
+            self.main_window.dispatcher.queue_mouse_job(self, confirmation.prompt, confirmation.result,
+                                                        partial(self.deliver, confirmation))
+
+    def handle_send_ack(self, payload):
+        confirmation = self.confirmations.get(payload.get('token'))
+        if confirmation:
+            print(f"{self.name} 发送已确认，用时 {payload.get('ms', 0)} 毫秒")
+            confirmation.acknowledge()
+
+    def handle_reply_chunk(self, token, offset, text):
+        reply_stream = self.reply_streams.get(token)
+        if reply_stream:
+            reply_stream.apply_chunk(offset, text)
+
+    def handle_reply_done(self, token, text):
+        reply_stream = self.reply_streams.pop(token, None)
+        if reply_stream is None:
+            return
+        self.send_queue.release(token)
+        reply_stream.finish(text)
+        ttft = reply_stream.time_to_first_token()
+        if ttft is not None:
+            print(f"{self.name} 回复完成，首字 {ttft:.2f} 秒，总计 {reply_stream.total_time():.2f} 秒")
+        self.main_window.record_reply(self, reply_stream)
+
+    def finish_confirmation(self, confirmation):
+        self.confirmations.pop(confirmation.token, None)
+        if confirmation.result.state == SendResult.CONFIRMED:
+            self.main_window.record_ack(self, confirmation.result.timestamps[SendResult.CONFIRMED] - confirmation.created_at)
+            if confirmation.token not in self.reply_streams:
+                # 不跟踪回复的站点在发送确认后就可以发送下一个
+                self.send_queue.release(confirmation.token)
+        PROFILER.end(('send_confirmation', confirmation.token), state=confirmation.result.state)
+        if confirmation.result.state == SendResult.FAILED:
+            # 没发出去的提示词不会有回复
+            self.reply_streams.pop(confirmation.token, None)
+            self.send_queue.release(confirmation.token)
+            PROFILER.end(('first_token', confirmation.token), state=SendResult.FAILED)
+        confirmation.deleteLater()
+
+    def query_send_state(self, token, callback):
+        js_code = f"window.__supperai ? window.__supperai.sendState({json.dumps(token)}) : null;"
+        self.browser.page().runJavaScript(js_code, callback)
 
     def open_coordinate_dialog(self):
         current_coords = {
@@ -1363,8 +4181,7 @@ class AIPlatform(QWidget):
         platform_coords['url'] = self.url
         self.config['platform_coordinates'][self.name] = platform_coords
         # Save to config file
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=4, ensure_ascii=False)
+        self.main_window.save_config()
 
     def load_coordinates(self):
         self.textbox_coordinate = None
@@ -1380,7 +4197,6 @@ class AIPlatform(QWidget):
             self.zoom_factor = platform_coords.get('zoom_factor', 1.0)
             self.url = platform_coords.get('url', self.url)
             self.address_bar.setText(self.url)
-            self.browser.load(QUrl(self.url))
             if self.send_method != 'javascript':
                 if self.textbox_coordinate and self.send_button_coordinate:
                     self.coordinates_valid = True
@@ -1390,11 +4206,16 @@ class AIPlatform(QWidget):
             self.browser.setZoomFactor(self.zoom_factor)
         self.update_coordinate_btn_text()
 
-    def send_prompt_with_pyautogui(self, prompt):
+    def send_prompt_with_pyautogui(self, prompt, result=None, token=None):
         # Check if coordinates are valid
         if not self.coordinates_valid:
+            if result is not None:
+                result.mark(SendResult.FAILED, "坐标未设置")
             QMessageBox.warning(self, "坐标未设置", f"{self.name} 的坐标可能需要重新设置。")
             return
+        if token:
+            # 在模拟键盘输入前记录页面状态，输入框清空并出现新消息后回报确认
+            self.browser.page().runJavaScript(f"window.__supperai && window.__supperai.watch({json.dumps(token)});")
         # Ensure window is in front
         self.main_window.raise_()
         self.main_window.activateWindow()
@@ -1407,7 +4228,8 @@ class AIPlatform(QWidget):
         # Clear existing text
         pyautogui.hotkey('ctrl', 'a')
         pyautogui.press('delete')
-        # Paste prompt using clipboard
+        # Paste prompt using clipboard（不计入剪贴板记录）
+        self.main_window.note_self_copy(prompt)
         pyperclip.copy(prompt)
         pyautogui.hotkey('ctrl', 'v')
 
@@ -1423,256 +4245,45 @@ class AIPlatform(QWidget):
             # Default to pressing enter
             pyautogui.press('enter')
 
+        if result is not None:
+            result.mark(SendResult.INJECTED)
         print(f"{self.name} 提示词发送完成")
 
-    def has_cleared_text(self):
-        # 根据发送方式判断
-        if self.send_method == 'javascript':
-            # Implement JavaScript check
-            # For now, we assume the prompt has been sent successfully
-            return True
-        else:
-            # Assume pyautogui method always succeeds
-            return True
-
     def handle_ai_reply(self, reply_content):
         # 处理 AI 平台的回复内容
         reply_log = f"[{self.name}] {time.strftime('%Y-%m-%d %H:%M:%S')}\n{reply_content}\n字数：{len(reply_content)}\n"
-        with open('ai_reply.log', 'a', encoding='utf-8') as f:
-            f.write(reply_log)
+        LOG_WRITER.write('ai_reply.log', reply_log)
 
-    def execute_js(self, prompt):
-        # 获取当前页面的URL
-        url = self.browser.url().toString()
-        domain = QUrl(url).host()
+    def execute_js(self, prompt, result=None, token=None):
+        # 站点适配脚本已在页面加载时注入，这里只需传入 JSON 编码的提示词
+        call_js = f"window.__supperai.send({json.dumps(prompt)}, {json.dumps(token)})"
+        js_code = f"window.__supperai ? {call_js} : 'not_installed';"
 
-        # 定义用于转义 JavaScript 字符串的函数
-        def escape_js_string(s):
-            return s.replace('\\', '\\\\').replace("'", "\\'").replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-
-        # 对 prompt 进行转义
-        escaped_prompt = escape_js_string(prompt)
-        # 对 prompt 进行 JSON 编码
-        prompt_js = json.dumps(prompt)
-
-        # 针对不同的平台，编写特定的 JavaScript 代码
-        js_code = ''
-        if 'chatglm.cn' in domain:
-            # ChatGLM
-            js_code = f"""
-            (function() {{
-                var textarea = document.querySelector('.input-box-inner textarea');
-                if (textarea) {{
-                    textarea.focus();
-                    // 使用浏览器原生的 value setter
-                    var nativeTextareaValueSetter = Object.getOwnPropertyDescriptor(window.HTMLTextAreaElement.prototype, 'value').set;
-                    nativeTextareaValueSetter.call(textarea, '{escaped_prompt}');
-                    // 触发输入事件
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    textarea.dispatchEvent(inputEvent);
-                    // 模拟点击发送按钮
-                    setTimeout(function() {{
-                        var btn = document.querySelector('.input-box-inner .input-box-icon');
-                        if (btn) {{
-                            btn.click();
-                        }} else {{
-                            console.log('未找到发送按钮');
-                        }}
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
-        elif 'yuanbao.tencent.com' in domain:
-            # 元宝
-            js_code = f"""
-            (function() {{
-                var editor = document.querySelector('.ql-editor[contenteditable="true"]');
-                if (editor) {{
-                    // 清空内容
-                    editor.innerHTML = '';
-                    // 插入新内容
-                    editor.focus();
-                    document.execCommand('insertText', false, {prompt_js});
-                    // 触发输入事件
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    editor.dispatchEvent(inputEvent);
-                    // 模拟点击发送按钮
-                    setTimeout(function() {{
-                        var btn = document.querySelector('a.style__send-btn___GVH0r');
-                        if (!btn) {{
-                            // 尝试使用其他选择器
-                            btn = document.querySelector('a[class^="style__send-btn"]');
-                        }}
-                        if (btn) {{
-                            btn.click();
-                        }} else {{
-                            console.log('未找到发送按钮');
-                        }}
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
-        elif 'doubao.com' in domain:
-            # 豆包
-            js_code = f"""
-            (function() {{
-                var textarea = document.querySelector('textarea.semi-input-textarea');
-                if (textarea) {{
-                    textarea.focus();
-                    var nativeTextareaValueSetter = Object.getOwnPropertyDescriptor(window.HTMLTextAreaElement.prototype, 'value').set;
-                    nativeTextareaValueSetter.call(textarea, {prompt_js});
-                    // 触发输入事件
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    textarea.dispatchEvent(inputEvent);
-                    // 模拟点击发送按钮
-                    setTimeout(function() {{
-                        var btn = document.querySelector('#flow-end-msg-send');
-                        if (btn) {{
-                            btn.click();
-                        }} else {{
-                            console.log('未找到发送按钮');
-                        }}
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
-        elif 'moonshot.cn' in domain:
-            # Kimi
-            js_code = f"""
-            (function() {{
-                var editor = document.querySelector('[data-testid="msh-chatinput-editor"][contenteditable="true"]');
-                if (editor) {{
-                    // 清空内容
-                    editor.innerHTML = '';
-                    // 插入新内容
-                    editor.focus();
-                    document.execCommand('insertText', false, {prompt_js});
-                    // 触发输入事件
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    editor.dispatchEvent(inputEvent);
-                    /* 延时后模拟按下 Enter 键 */
-                    setTimeout(function() {{
-                        var enterEvent = new KeyboardEvent('keydown', {{
-                            key: 'Enter',
-                            code: 'Enter',
-                            keyCode: 13,
-                            which: 13,
-                            bubbles: true,
-                            cancelable: true
-                        }});
-                        editor.dispatchEvent(enterEvent);
-                        var keyupEvent = new KeyboardEvent('keyup', {{
-                            key: 'Enter',
-                            code: 'Enter',
-                            keyCode: 13,
-                            which: 13,
-                            bubbles: true,
-                            cancelable: true
-                        }});
-                        editor.dispatchEvent(keyupEvent);
-                        // 检查发送是否成功
-                        setTimeout(function() {{
-                            if (editor.textContent.trim() !== '') {{
-                                editor.dispatchEvent(enterEvent);
-                                editor.dispatchEvent(keyupEvent);
-                            }}
-                        }}, 500);
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
-        elif 'chatgpt.com' in domain:
-            # ChatGPT
-            js_code = f"""
-            (function() {{
-                var textarea = document.querySelector('textarea');
-                if (textarea) {{
-                    textarea.focus();
-                    var nativeTextareaValueSetter = Object.getOwnPropertyDescriptor(window.HTMLTextAreaElement.prototype, 'value').set;
-                    nativeTextareaValueSetter.call(textarea, '{escaped_prompt}');
-                    // 触发输入事件
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    textarea.dispatchEvent(inputEvent);
-                    // 模拟点击发送按钮
-                    setTimeout(function() {{
-                        var btn = document.querySelector('button[aria-label="发送消息"]');
-                        if (!btn) {{
-                            // 尝试其他选择器
-                            btn = document.querySelector('button:has(svg.icon-md)');
-                        }}
-                        if (btn) {{
-                            btn.click();
-                        }} else {{
-                            console.log('未找到发送按钮');
-                        }}
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
-        else:
-            # 默认处理方式
-            js_code = f"""
-            (function() {{
-                var textarea = document.querySelector('textarea');
-                if (textarea) {{
-                    textarea.focus();
-                    var nativeTextareaValueSetter = Object.getOwnPropertyDescriptor(window.HTMLTextAreaElement.prototype, 'value').set;
-                    nativeTextareaValueSetter.call(textarea, '{escaped_prompt}');
-                    var inputEvent = new Event('input', {{ bubbles: true }});
-                    textarea.dispatchEvent(inputEvent);
-                    // 尝试点击发送按钮
-                    setTimeout(function() {{
-                        var btn = document.querySelector('button[type="submit"], button.send');
-                        if (btn) {{
-                            btn.click();
-                        }} else {{
-                            console.log('未找到发送按钮，尝试模拟按下 Enter 键');
-                            // 模拟按下 Enter 键
-                            var enterEvent = new KeyboardEvent('keydown', {{
-                                key: 'Enter',
-                                code: 'Enter',
-                                keyCode:13,
-                                which:13,
-                                bubbles: true,
-                                cancelable: true
-                            }});
-                            textarea.dispatchEvent(enterEvent);
-                        }}
-                    }}, 500);
-                    return 'success';
-                }} else {{
-                    return '未找到输入框';
-                }}
-            }})();
-            """
+        PROFILER.begin(('js_injection', token), 'js_injection', platform=self.name)
 
         # 定义回调函数，处理执行结果和错误
-        def js_callback(result):
-            if result != 'success':
-                error_message = f"{self.name} 执行 JavaScript 出错：{result}"
+        def js_callback(js_result):
+            PROFILER.end(('js_injection', token), result=str(js_result))
+            if js_result != 'success':
+                error_message = f"{self.name} 执行 JavaScript 出错：{js_result}"
                 print(error_message)
-                with open('javascript_errors.log', 'a', encoding='utf-8') as f:
-                    f.write(error_message + '\n')
+                LOG_WRITER.write('javascript_errors.log', error_message + '\n')
+                if result is not None:
+                    result.mark(SendResult.FAILED, js_result)
             else:
+                if result is not None:
+                    result.mark(SendResult.INJECTED)
                 print(f"{self.name} 提示词发送成功")
 
+        def send_callback(js_result):
+            if js_result == 'not_installed':
+                # 页面在脚本注册前已加载（或脚本被页面清除），补注入一次运行时后再发送
+                self.browser.page().runJavaScript(SITE_ADAPTERS.runtime_script() + call_js, js_callback)
+            else:
+                js_callback(js_result)
+
         # 执行 JavaScript 代码
-        self.browser.page().runJavaScript(js_code, js_callback)
+        self.browser.page().runJavaScript(js_code, send_callback)
 
     def inject_highlight_script(self):
         # JavaScript 脚本，用于实现划线标记功能
@@ -1688,33 +4299,68 @@ class AIPlatform(QWidget):
         self.copy_highlights_btn.setText(f"复制划线内容 ({color})")
 
     def get_highlighted_text(self, callback):
-        js_code = """
-        (function() {
-            var highlights = document.querySelectorAll('span.highlight');
-            var texts = [];
-            highlights.forEach(function(span) {
-                texts.push(span.innerText);
-            });
-            return texts.join('\\n');
-        })();
-        """
-        self.browser.page().runJavaScript(js_code, callback)
+        # 只取页面报告已显示的划线，内容直接查划线索引；保留回调形式以便跨进程调用
+        callback('\n'.join(self.main_window.highlights.texts(self.anchored_highlights)))
 
     def copy_highlights_to_prompt(self):
         # 已在 PromptTab 中实现，因此此方法可以移除或保留为空
         pass
 
 
+class StaticAssetRecorder(QWebEngineUrlRequestInterceptor):
+    # 记录页面加载过的脚本、样式和字体地址，下次启动时用于预热 HTTP 缓存。
+    # interceptRequest 在网络线程中调用，只做加锁的集合写入
+    RECORDED_TYPES = ('ResourceTypeScript', 'ResourceTypeStylesheet', 'ResourceTypeFontResource')
+    MAX_ASSETS = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.assets = OrderedDict()
+        self.lock = threading.Lock()
+        self.types = {getattr(QWebEngineUrlRequestInfo, name) for name in self.RECORDED_TYPES
+                      if hasattr(QWebEngineUrlRequestInfo, name)}
+
+    def interceptRequest(self, info):
+        if info.resourceType() in self.types and info.requestMethod() == b'GET':
+            url = info.requestUrl().toString()
+            with self.lock:
+                self.assets[url] = None
+                self.assets.move_to_end(url)
+                while len(self.assets) > self.MAX_ASSETS:
+                    self.assets.popitem(last=False)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.assets)
+
+
 class ProfileManager:
-    # 保持不变
-    def __init__(self):
+    # 浏览器配置池：每个站点域名一个持久化配置（各自的 Cookie 和登录状态），另有一个共享配置
+    # 供提示词管理器中的浏览器使用。缓存类型和容量来自 config.json 的 profile_cache，
+    # 加载过的静态资源地址记录在各配置目录的 warmup.json 中，启动时预先请求以填充缓存
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+    SHARED_NAME = 'shared'
+    CACHE_DEFAULTS = {'mode': 'disk', 'max_mb': 256, 'warmup': True, 'overrides': {}}
+    CACHE_TYPES = {
+        'disk': QWebEngineProfile.DiskHttpCache,
+        'memory': QWebEngineProfile.MemoryHttpCache,
+        'none': QWebEngineProfile.NoCache,
+    }
+
+    def __init__(self, cache_config=None):
         self.profiles = {}
+        self.recorders = {}
+        self.warmup_pages = []
+        self.cache_config = dict(self.CACHE_DEFAULTS, **(cache_config or {}))
         self.storage_location = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
         os.makedirs(self.storage_location, exist_ok=True)
 
+    def storage_path(self, name):
+        return os.path.join(self.storage_location, 'SupperAI', name)
+
     def get_profile(self, domain):
         if domain not in self.profiles:
-            storage_path = os.path.join(self.storage_location, 'SupperAI', domain)
+            storage_path = self.storage_path(domain)
             os.makedirs(storage_path, exist_ok=True)
             profile = QWebEngineProfile(domain, None)
             profile.setPersistentStoragePath(storage_path)
@@ -1722,61 +4368,1196 @@ class ProfileManager:
             # 设置缓存路径
             cache_path = os.path.join(storage_path, 'cache')
             profile.setCachePath(cache_path)
+            self.apply_cache_settings(profile, domain)
+            profile.setHttpUserAgent(self.USER_AGENT)
+            recorder = StaticAssetRecorder(profile)
+            if hasattr(profile, 'setUrlRequestInterceptor'):
+                profile.setUrlRequestInterceptor(recorder)
+            else:
+                profile.setRequestInterceptor(recorder)
+            self.recorders[domain] = recorder
             self.profiles[domain] = profile
         return self.profiles[domain]
 
+    def apply_cache_settings(self, profile, name):
+        settings = dict(self.cache_config, **self.cache_config['overrides'].get(name, {}))
+        cache_type = self.CACHE_TYPES.get(settings['mode'], QWebEngineProfile.DiskHttpCache)
+        profile.setHttpCacheType(cache_type)
+        # 限制磁盘缓存大小，超出后由 Chromium 自行淘汰旧条目
+        profile.setHttpCacheMaximumSize(int(settings['max_mb']) * 1024 * 1024)
+
+    def shared_profile(self):
+        return self.get_profile(self.SHARED_NAME)
+
+    def profile_for_url(self, url):
+        # 提示词管理器中的浏览器：已有平台窗口使用的站点沿用该站点的配置（共用缓存和登录状态），
+        # 其他网址使用共享配置
+        domain = QUrl(url).host()
+        if domain in self.profiles:
+            return self.profiles[domain]
+        return self.shared_profile()
+
+    def create_view(self, url=None):
+        view = QWebEngineView()
+        view.setPage(QWebEnginePage(self.profile_for_url(url or ''), view))
+        return view
+
+    def warmup_file(self, name):
+        return os.path.join(self.storage_path(name), 'warmup.json')
+
+    def warm_up(self, domain):
+        # 在后台页面中以 force-cache 方式请求上次记录的静态资源，缓存中已有的不会访问网络
+        if not self.cache_config['warmup'] or self.cache_config['mode'] == 'none':
+            return
+        try:
+            with open(self.warmup_file(domain), 'r', encoding='utf-8') as f:
+                assets = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not assets:
+            return
+        page = QWebEnginePage(self.get_profile(domain))
+        self.warmup_pages.append(page)
+        script = ("Promise.all(%s.map(function (u) { return fetch(u, {mode: 'no-cors', cache: 'force-cache'})"
+                  ".catch(function () {}); }));" % json.dumps(assets))
+        page.setHtml(f"<script>{script}</script>", QUrl(f"https://{domain}/"))
+        # 预热请求发出后释放页面
+        QTimer.singleShot(15000, partial(self.release_warmup_page, page))
+
+    def release_warmup_page(self, page):
+        if page in self.warmup_pages:
+            self.warmup_pages.remove(page)
+            page.deleteLater()
+
+    def save_warmup_lists(self):
+        for name, recorder in self.recorders.items():
+            assets = recorder.snapshot()
+            if not assets:
+                continue
+            try:
+                with open(self.warmup_file(name), 'w', encoding='utf-8') as f:
+                    json.dump(assets, f, indent=4, ensure_ascii=False)
+            except OSError as e:
+                print(f"保存缓存预热列表失败：{e}")
+
+    def disk_usage(self):
+        # 各配置目录（含缓存）占用的磁盘空间，单位字节
+        usage = {}
+        root = os.path.join(self.storage_location, 'SupperAI')
+        if not os.path.isdir(root):
+            return usage
+        for name in sorted(os.listdir(root)):
+            total = 0
+            for dirpath, _, filenames in os.walk(os.path.join(root, name)):
+                for filename in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, filename))
+                    except OSError:
+                        pass
+            usage[name] = total
+        return usage
+
+
+class SendResult:
+    # 单个平台一次发送的状态及各状态的时间戳
+    QUEUED = 'queued'
+    INJECTED = 'injected'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+
+    def __init__(self, platform_name, prompt, send_method):
+        self.platform_name = platform_name
+        self.prompt = prompt
+        self.send_method = send_method
+        self.state = self.QUEUED
+        self.error = None
+        self.timestamps = {self.QUEUED: time.time()}
+        self.listener = None  # 状态变化时回调，由 BroadcastDispatcher 设置
+
+    def mark(self, state, error=None):
+        # 已确认或已失败的结果不再回退
+        if self.is_settled():
+            return
+        self.state = state
+        self.error = error
+        self.timestamps[state] = time.time()
+        if self.listener:
+            self.listener(self)
+
+    def is_settled(self):
+        return self.state in (self.CONFIRMED, self.FAILED)
+
+    def is_delivered(self):
+        return self.state != self.QUEUED
+
+    def elapsed(self, state):
+        # 从排队到指定状态所用的秒数，未到达该状态时返回 None
+        if state not in self.timestamps:
+            return None
+        return self.timestamps[state] - self.timestamps[self.QUEUED]
+
+    def __repr__(self):
+        return f"<SendResult {self.platform_name} {self.state}>"
+
+
+class Broadcast:
+    # 一次群发：提示词以及每个平台的 SendResult
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.started_at = time.time()
+        self.delivered_at = None
+        self.finished_at = None
+        self.results = {}  # 平台窗口 -> SendResult；同名平台可以开多个窗口，不能按名称区分
+
+    def add(self, ai_widget):
+        result = SendResult(ai_widget.name, self.prompt, ai_widget.send_method)
+        self.results[ai_widget] = result
+        return result
+
+    def is_delivered(self):
+        return all(r.is_delivered() for r in self.results.values())
+
+    def is_finished(self):
+        return all(r.is_settled() for r in self.results.values())
+
+    def fanout_time(self):
+        if self.delivered_at is None:
+            return None
+        return self.delivered_at - self.started_at
+
+
+class BroadcastDispatcher(QObject):
+    # 群发调度：JavaScript 注入的平台同时发送（runJavaScript 本身是异步的），
+    # 依赖鼠标键盘的 pyautogui 平台只能逐个执行，放入队列，每个任务之间让出事件循环
+    broadcast_started = pyqtSignal(object)
+    result_changed = pyqtSignal(object)
+    broadcast_finished = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.mouse_queue = deque()
+        self.mouse_scheduled = False
+        self.mouse_waiting = None  # 独立进程中的鼠标任务，等它完成输入后再执行下一个
+        self.mouse_wait_timer = QTimer(self)
+        self.mouse_wait_timer.setSingleShot(True)
+        self.mouse_wait_timer.timeout.connect(self.end_mouse_wait)
+        self.broadcasts = []
+
+    def dispatch(self, prompt, platforms):
+        broadcast = Broadcast(prompt)
+        self.broadcasts.append(broadcast)
+        for ai_widget in platforms:
+            result = broadcast.add(ai_widget)
+            result.listener = partial(self.on_result_changed, broadcast)
+        # 在任何平台开始发送之前通知，回复流因此能归入这次群发
+        self.broadcast_started.emit(broadcast)
+        for ai_widget in platforms:
+            result = broadcast.results[ai_widget]
+            if ai_widget.send_method == 'javascript':
+                ai_widget.send_prompt(prompt, result)
+            else:
+                self.mouse_queue.append((ai_widget, prompt, result, None))
+        self.schedule_mouse_job()
+        if not platforms:
+            broadcast.delivered_at = broadcast.finished_at = broadcast.started_at
+            self.broadcast_finished.emit(broadcast)
+        return broadcast
+
+    def queue_mouse_job(self, ai_widget, prompt, result, job=None):
+        self.mouse_queue.append((ai_widget, prompt, result, job))
+        self.schedule_mouse_job()
+
+    def schedule_mouse_job(self):
+        if self.mouse_queue and not self.mouse_scheduled and self.mouse_waiting is None:
+            self.mouse_scheduled = True
+            QTimer.singleShot(0, self.run_next_mouse_job)
+
+    def run_next_mouse_job(self):
+        self.mouse_scheduled = False
+        if not self.mouse_queue:
+            return
+        ai_widget, prompt, result, job = self.mouse_queue.popleft()
+        try:
+            if job:
+                job()
+            else:
+                ai_widget.send_prompt(prompt, result)
+        except Exception as e:
+            # pyautogui 的 FailSafeException 等异常只影响当前平台
+            result.mark(SendResult.FAILED, str(e))
+        if getattr(ai_widget, 'is_remote', False) and not result.is_delivered():
+            # 鼠标键盘只有一套，跨进程也必须逐个执行
+            self.mouse_waiting = result
+            self.mouse_wait_timer.start(10000)
+            return
+        self.schedule_mouse_job()
+
+    def end_mouse_wait(self):
+        self.mouse_waiting = None
+        self.mouse_wait_timer.stop()
+        self.schedule_mouse_job()
+
+    def forget(self, ai_widget):
+        # 平台窗口被销毁时，丢弃它仍在排队的鼠标任务
+        remaining = deque()
+        for entry in self.mouse_queue:
+            if entry[0] is ai_widget:
+                entry[2].mark(SendResult.FAILED, "窗口已关闭")
+            else:
+                remaining.append(entry)
+        self.mouse_queue = remaining
+
+    def on_result_changed(self, broadcast, result):
+        self.result_changed.emit(result)
+        if result is self.mouse_waiting:
+            self.end_mouse_wait()
+        if broadcast.delivered_at is None and broadcast.is_delivered():
+            broadcast.delivered_at = time.time()
+            print(f"提示词分发完成，用时 {broadcast.fanout_time():.2f} 秒")
+        if broadcast.finished_at is None and broadcast.is_finished():
+            broadcast.finished_at = time.time()
+            if broadcast in self.broadcasts:
+                self.broadcasts.remove(broadcast)
+            confirmed = sum(1 for r in broadcast.results.values() if r.state == SendResult.CONFIRMED)
+            print(f"提示词发送确认 {confirmed}/{len(broadcast.results)}")
+            self.broadcast_finished.emit(broadcast)
+
+
+class GatherResult:
+    # 单个平台在一次并行查询中的结果
+    PENDING = 'pending'
+    OK = 'ok'
+    TIMEOUT = 'timeout'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.state = self.PENDING
+        self.value = None
+        self.latency_ms = None
+
+
+class ScatterGather(QObject):
+    # 向多个平台窗口同时发出同一个查询（query(widget, callback) 形式的函数），
+    # 按窗口顺序收集结果。超时或取消时未返回的窗口记为 timeout/cancelled，已返回的部分结果照常交付，
+    # 之后迟到的回调直接丢弃，慢窗口不会卡住整个操作
+    finished = pyqtSignal(list)  # [GatherResult]，与窗口顺序一致
+
+    def __init__(self, widgets, query, timeout_ms=3000, label='scatter_gather', parent=None):
+        super().__init__(parent)
+        self.widgets = list(widgets)
+        self.query = query
+        self.label = label
+        self.results = [GatherResult(i, getattr(w, 'name', str(i))) for i, w in enumerate(self.widgets)]
+        self.remaining = len(self.widgets)
+        self.started_at = None
+        self.done = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(timeout_ms)
+        self.timer.timeout.connect(lambda: self.finish(GatherResult.TIMEOUT))
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        if not self.widgets:
+            QTimer.singleShot(0, lambda: self.finish(GatherResult.OK))
+            return self
+        self.timer.start()
+        for index, widget in enumerate(self.widgets):
+            PROFILER.begin((self.label, id(self), index), self.label, platform=self.results[index].name)
+            callback = partial(self.on_reply, index)
+            try:
+                self.query(widget, callback)
+            except RuntimeError as e:
+                # 窗口已被销毁
+                print(f"{self.results[index].name} 查询失败：{e}")
+        return self
+
+    def on_reply(self, index, value):
+        result = self.results[index]
+        if self.done or result.state != GatherResult.PENDING:
+            return
+        result.state = GatherResult.OK
+        result.value = value
+        result.latency_ms = (time.perf_counter() - self.started_at) * 1000
+        PROFILER.end((self.label, id(self), index), state=result.state)
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.finish(GatherResult.OK)
+
+    def cancel(self):
+        self.finish(GatherResult.CANCELLED)
+
+    def finish(self, pending_state):
+        if self.done:
+            return
+        self.done = True
+        self.timer.stop()
+        for result in self.results:
+            if result.state == GatherResult.PENDING:
+                result.state = pending_state
+                PROFILER.end((self.label, id(self), result.index), state=pending_state)
+        slow = [f"{r.name}({r.state})" for r in self.results if r.state != GatherResult.OK]
+        if slow:
+            print(f"{self.label}：未及时返回的平台 {', '.join(slow)}")
+        self.finished.emit(self.results)
+        self.deleteLater()
+
+
+class PageLifecycleManager(QObject):
+    # 页面生命周期管理：不可见且空闲的页面先冻结（停止脚本和定时器），总内存超过预算时
+    # 按最近使用顺序丢弃最久未用的不可见页面（释放渲染进程内存）；页面重新显示时恢复，
+    # 被丢弃的页面重新加载离开时的网址。Qt 5.14 之前没有生命周期状态，丢弃改为加载空白页
+    CHECK_INTERVAL_MS = 30000
+    ESTIMATED_PAGE_MB = 150  # 没有 psutil 时每个活动页面的估算内存
+
+    def __init__(self, freeze_after_s=300, memory_budget_mb=3000, parent=None):
+        super().__init__(parent)
+        self.freeze_after_s = freeze_after_s
+        self.memory_budget_mb = memory_budget_mb
+        self.pages = OrderedDict()  # 视图 -> 记录，按最近使用排序（最近的在末尾）
+        self.supports_lifecycle = hasattr(QWebEnginePage, 'LifecycleState')
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(self.CHECK_INTERVAL_MS)
+
+    def register(self, view, name, is_busy=None):
+        # is_busy 返回 True 时（例如等待回复）页面不会被冻结或丢弃
+        self.pages[view] = {'name': name, 'state': 'active', 'last_used': time.time(),
+                            'url': None, 'is_busy': is_busy}
+        view.installEventFilter(self)
+        view.destroyed.connect(lambda _=None, v=view: self.pages.pop(v, None))
+
+    def unregister(self, view):
+        if self.pages.pop(view, None) is not None:
+            view.removeEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (event.Show, event.FocusIn, event.MouseButtonPress) and obj in self.pages:
+            self.activate(obj)
+        return False
+
+    def activate(self, view):
+        # 页面获得焦点或需要使用（如发送提示词）时调用：恢复为活动状态并标记为最近使用。
+        # 返回页面是否因此重新加载（之前已被丢弃）
+        record = self.pages.get(view)
+        if record is None:
+            return False
+        record['last_used'] = time.time()
+        self.pages.move_to_end(view)
+        if record['state'] == 'active':
+            return False
+        previous = record['state']
+        record['state'] = 'active'
+        page = view.page()
+        if self.supports_lifecycle:
+            page.setLifecycleState(QWebEnginePage.LifecycleState.Active)
+        if previous == 'discarded' and record['url'] and (not self.supports_lifecycle or page.url().isEmpty()):
+            view.load(record['url'])
+        print(f"页面 {record['name']} 已恢复")
+        return previous == 'discarded'
+
+    def is_idle_candidate(self, view, record):
+        if view.isVisible():
+            return False
+        return not (record['is_busy'] and record['is_busy']())
+
+    def check(self):
+        now = time.time()
+        for view, record in self.pages.items():
+            if record['state'] == 'active' and self.is_idle_candidate(view, record) \
+                    and now - record['last_used'] >= self.freeze_after_s:
+                self.freeze(view, record)
+        usage = self.memory_usage_mb()
+        if usage <= self.memory_budget_mb:
+            return
+        # 超出预算：从最久未用的页面开始丢弃，直到估算值回到预算以内
+        for view, record in list(self.pages.items()):
+            if usage <= self.memory_budget_mb:
+                break
+            if record['state'] != 'discarded' and self.is_idle_candidate(view, record):
+                self.discard(view, record)
+                usage -= self.ESTIMATED_PAGE_MB
+
+    def freeze(self, view, record):
+        if self.supports_lifecycle:
+            view.page().setLifecycleState(QWebEnginePage.LifecycleState.Frozen)
+            record['state'] = 'frozen'
+
+    def discard(self, view, record):
+        record['url'] = view.url()
+        if self.supports_lifecycle:
+            view.page().setLifecycleState(QWebEnginePage.LifecycleState.Discarded)
+        else:
+            view.load(QUrl('about:blank'))
+        record['state'] = 'discarded'
+        print(f"内存超出预算，已释放页面 {record['name']}")
+
+    def memory_usage_mb(self):
+        # 有 psutil 时统计本进程及渲染子进程的实际内存，否则按活动页面数估算
+        if psutil is not None:
+            try:
+                process = psutil.Process()
+                total = process.memory_info().rss
+                for child in process.children(recursive=True):
+                    try:
+                        total += child.memory_info().rss
+                    except psutil.Error:
+                        pass
+                return total / (1024 * 1024)
+            except psutil.Error:
+                pass
+        live = sum(1 for record in self.pages.values() if record['state'] != 'discarded')
+        return live * self.ESTIMATED_PAGE_MB
+
+
+class PlatformWidgetPool:
+    # 平台窗口池：按平台名保存仍然存活的 AIPlatform。减少窗口数量时多出的窗口只是隐藏备用，
+    # 再次增加时直接取回，页面不会重新加载；备用窗口超过上限时最早放回的被显式销毁
+    def __init__(self, max_spare=6):
+        self.max_spare = max_spare
+        self.active = {}  # key -> AIPlatform，正在布局中显示
+        self.spare = OrderedDict()  # key -> AIPlatform，按放回顺序
+
+    def acquire(self, key):
+        # 优先取显示中的窗口，其次取备用窗口；都没有时返回 None，由调用方创建
+        widget = self.active.get(key)
+        if widget is None:
+            widget = self.spare.pop(key, None)
+            if widget is not None:
+                self.active[key] = widget
+        return widget
+
+    def add(self, key, widget):
+        self.active[key] = widget
+
+    def release_except(self, keys):
+        # 不在 keys 中的显示窗口放回备用
+        for key in [k for k in self.active if k not in keys]:
+            widget = self.active.pop(key)
+            widget.hide()
+            self.spare[key] = widget
+            self.spare.move_to_end(key)
+        while len(self.spare) > self.max_spare:
+            _, widget = self.spare.popitem(last=False)
+            self.dispose(widget)
+
+    def dispose(self, widget):
+        widget.dispose()
+
+
+class StartupScheduler(QObject):
+    # 分阶段启动：窗口先显示，耗时的初始化步骤按优先级排队，每次事件循环只执行一步，
+    # 界面在各步骤之间保持响应
+    finished = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = []  # (priority, 序号, 分组, 任务)
+        self.counter = 0
+        self.started_at = time.perf_counter()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.run_next)
+
+    def schedule(self, job, priority=0, group=None):
+        self.counter += 1
+        heapq.heappush(self.jobs, (priority, self.counter, group, job))
+        self.timer.start()
+
+    def cancel(self, group):
+        # 取消尚未执行的同组任务，例如平台数量在启动过程中被修改
+        self.jobs = [item for item in self.jobs if item[2] != group]
+        heapq.heapify(self.jobs)
+
+    def run_next(self):
+        if not self.jobs:
+            return
+        _, _, _, job = heapq.heappop(self.jobs)
+        job()
+        if self.jobs:
+            self.timer.start()
+        else:
+            print(f"启动任务全部完成，用时 {time.perf_counter() - self.started_at:.2f} 秒")
+            PROFILER.instant('startup_finished')
+            self.finished.emit()
+
+
+class JsonLineChannel(QObject):
+    # 进程间通信：QLocalSocket 上每行一条 JSON 消息
+    message_received = pyqtSignal(dict)
+    disconnected = pyqtSignal()
+
+    def __init__(self, socket, parent=None):
+        super().__init__(parent)
+        self.socket = socket
+        self.buffer = b''
+        socket.setParent(self)
+        socket.readyRead.connect(self.on_ready_read)
+        socket.disconnected.connect(self.disconnected)
+
+    def send(self, message):
+        if self.socket.state() == QLocalSocket.ConnectedState:
+            self.socket.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def on_ready_read(self):
+        self.buffer += bytes(self.socket.readAll())
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            self.message_received.emit(message)
+
+
+class PaneProcessHub(QObject):
+    # 多进程模式下主进程一端：监听本地套接字，按平台窗口的 key 把工作进程的连接交给对应的 RemotePlatform
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        self.server_name = f"supperai-{os.getpid()}"
+        QLocalServer.removeServer(self.server_name)
+        self.server.listen(self.server_name)
+        self.server.newConnection.connect(self.on_new_connection)
+        self.waiting = {}  # key -> RemotePlatform
+
+    def start_worker(self, remote):
+        self.waiting[remote.key] = remote
+        process = QProcess(remote)
+        args = [os.path.abspath(__file__), '--pane-worker', self.server_name, remote.key,
+                remote.name, remote.url, str(remote.window_index), remote.initial_url or '']
+        process.start(sys.executable, args)
+        return process
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            channel = JsonLineChannel(self.server.nextPendingConnection(), self)
+            channel.message_received.connect(partial(self.on_first_message, channel))
+
+    def on_first_message(self, channel, message):
+        channel.message_received.disconnect()
+        remote = self.waiting.pop(message.get('key'), None)
+        if message.get('type') != 'hello' or remote is None:
+            channel.socket.disconnectFromServer()
+            return
+        remote.attach(channel, message)
+
+
+class RemotePlatform(QWidget):
+    # 多进程模式下主进程中的平台窗口：真正的 AIPlatform 运行在独立的工作进程中，窗口通过原生句柄嵌入，
+    # 发送、回复和状态通过 JsonLineChannel 传递。对 MainWindow 和 BroadcastDispatcher 提供与 AIPlatform 相同的接口
+    reply_stream_started = pyqtSignal(object)
+    is_remote = True
+
+    def __init__(self, key, name, url, window_index, main_window, initial_url=None, parent=None):
+        super().__init__(parent)
+        self.key = key
+        self.name = name
+        self.url = url
+        self.window_index = window_index
+        self.main_window = main_window
+        self.initial_url = initial_url
+        self.send_method = main_window.config.get('platform_coordinates', {}).get(name, {}).get('send_method', 'enter')
+        self.channel = None
+        self.results = {}  # 发送编号 -> SendResult
+        self.reply_streams = {}  # token -> ReplyStream
+        self.calls = {}  # 调用编号 -> 回调
+        self.pending = []  # 工作进程连接前要发送的消息
+        self.counter = 0
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.status_label = QLabel(f"{name} 正在启动独立进程……")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+        self.process = main_window.pane_hub.start_worker(self)
+        self.process.finished.connect(self.on_process_finished)
+
+    def attach(self, channel, hello):
+        self.channel = channel
+        channel.setParent(self)
+        channel.message_received.connect(self.on_message)
+        channel.disconnected.connect(self.on_process_finished)
+        self.send_method = hello.get('send_method', self.send_method)
+        self.url = hello.get('url', self.url)
+        # 嵌入工作进程的窗口
+        window = QWindow.fromWinId(int(hello['win_id']))
+        self.container = QWidget.createWindowContainer(window, self)
+        self.layout().replaceWidget(self.status_label, self.container)
+        self.status_label.hide()
+        for message in self.pending:
+            channel.send(message)
+        self.pending = []
+
+    def post(self, message):
+        if self.channel is not None:
+            self.channel.send(message)
+        else:
+            self.pending.append(message)
+
+    def send_prompt(self, prompt, result=None):
+        if result is None:
+            result = SendResult(self.name, prompt, self.send_method)
+        self.counter += 1
+        self.results[self.counter] = result
+        self.post({'type': 'send', 'id': self.counter, 'prompt': prompt})
+        return result
+
+    def call(self, method, callback, **kwargs):
+        self.counter += 1
+        self.calls[self.counter] = callback
+        self.post(dict(kwargs, type='call', id=self.counter, method=method))
+
+    def get_highlighted_text(self, callback):
+        self.call('highlighted_text', callback)
+
+    def fetch_title(self, callback):
+        self.call('title', callback)
+
+    def current_url(self):
+        return self.url
+
+    def open_url(self, url):
+        self.url = url
+        self.post({'type': 'open_url', 'url': url})
+
+    def set_highlight_color(self, color):
+        self.post({'type': 'highlight_color', 'color': color})
+
+    def is_busy(self):
+        return bool(self.results or self.reply_streams)
+
+    def handle_ai_reply(self, reply_content):
+        reply_log = f"[{self.name}] {time.strftime('%Y-%m-%d %H:%M:%S')}\n{reply_content}\n字数：{len(reply_content)}\n"
+        LOG_WRITER.write('ai_reply.log', reply_log)
+
+    def on_message(self, message):
+        kind = message.get('type')
+        if kind == 'result':
+            result = self.results.get(message['id'])
+            if result is not None:
+                result.mark(message['state'], message.get('error'))
+                if result.is_settled():
+                    self.results.pop(message['id'], None)
+        elif kind == 'reply_started':
+            reply_stream = ReplyStream(self.name, message['prompt'], message['token'],
+                                       result=self.results.get(message.get('send_id')))
+            self.reply_streams[message['token']] = reply_stream
+            self.reply_stream_started.emit(reply_stream)
+        elif kind == 'reply_chunk':
+            reply_stream = self.reply_streams.get(message['token'])
+            if reply_stream:
+                reply_stream.apply_chunk(message['offset'], message['text'])
+        elif kind == 'reply_done':
+            reply_stream = self.reply_streams.pop(message['token'], None)
+            if reply_stream:
+                reply_stream.finish(message['text'])
+                self.main_window.record_reply(self, reply_stream)
+        elif kind == 'return':
+            callback = self.calls.pop(message['id'], None)
+            if callback:
+                callback(message.get('value'))
+        elif kind == 'self_copy':
+            self.main_window.note_self_copy(message['text'])
+            self.post({'type': 'self_copy_ack', 'id': message.get('id')})
+        elif kind == 'ack_sample':
+            self.main_window.record_ack(self, message['seconds'])
+        elif kind == 'url':
+            self.url = message['url']
+        elif kind == 'send_method':
+            self.send_method = message['send_method']
+        elif kind == 'coordinates':
+            self.main_window.config.setdefault('platform_coordinates', {})[self.name] = message['coordinates']
+            self.main_window.save_config()
+
+    def on_process_finished(self, *args):
+        # 工作进程退出或崩溃：未完成的发送记为失败，其他平台不受影响
+        for result in self.results.values():
+            result.mark(SendResult.FAILED, "窗口进程已退出")
+        self.results.clear()
+        for callback in self.calls.values():
+            callback(None)
+        self.calls.clear()
+        if self.channel is not None:
+            self.channel = None
+            self.status_label.setText(f"{self.name} 的窗口进程已退出")
+            self.status_label.show()
+
+    def dispose(self):
+        self.post({'type': 'quit'})
+        self.on_process_finished()
+        self.process.finished.disconnect()
+        if not self.process.waitForFinished(1000):
+            self.process.kill()
+        self.main_window.dispatcher.forget(self)
+        self.setParent(None)
+        self.deleteLater()
+
+
+class PaneWorker(QObject):
+    # 工作进程一端：运行单个 AIPlatform，并为它提供 MainWindow 的那部分接口（调度、生命周期、配置池、
+    # 回复记录），把发送结果和回复流转发给主进程
+    def __init__(self, server_name, key, name, url, window_index, initial_url):
+        super().__init__()
+        self.key = key
+        with open('config.json', 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.send_ids = {}  # SendResult -> 主进程的发送编号
+        self.self_copy_counter = 0
+        self.self_copy_acks = set()
+        self.dispatcher = BroadcastDispatcher(self)
+        # 划线索引和统计与主进程共用同一个数据库（WAL 模式支持多进程访问）
+        self.store = PromptStore('supperai.db')
+        self.highlights = HighlightIndex(self.store)
+        self.lifecycle = PageLifecycleManager(self.config.get('page_freeze_after_s', 300),
+                                              self.config.get('memory_budget_mb', 3000), self)
+        self.profile_manager = ProfileManager(self.config.get('profile_cache'))
+        self.profile_manager.warm_up(QUrl(url).host())
+        self.ai_widget = AIPlatform(name, url, self.profile_manager, self.config.get('common_urls', {}),
+                                    window_index, self.config, self, initial_url=initial_url or None)
+        self.ai_widget.setWindowFlags(Qt.FramelessWindowHint)
+        self.ai_widget.reply_stream_started.connect(self.on_reply_stream_started)
+        self.ai_widget.browser.urlChanged.connect(lambda u: self.channel.send({'type': 'url', 'url': u.toString()}))
+        self.lifecycle.register(self.ai_widget.browser, name, self.ai_widget.is_busy)
+        socket = QLocalSocket(self)
+        socket.connectToServer(server_name)
+        if not socket.waitForConnected(5000):
+            raise RuntimeError(f"无法连接主进程 {server_name}")
+        self.channel = JsonLineChannel(socket, self)
+        self.channel.message_received.connect(self.on_message)
+        self.channel.disconnected.connect(QApplication.instance().quit)
+        self.ai_widget.show()
+        self.channel.send({'type': 'hello', 'key': key, 'win_id': int(self.ai_widget.winId()),
+                           'send_method': self.ai_widget.send_method, 'url': self.ai_widget.url})
+        self.ai_widget.start_loading()
+
+    def on_message(self, message):
+        kind = message.get('type')
+        if kind == 'send':
+            result = SendResult(self.ai_widget.name, message['prompt'], self.ai_widget.send_method)
+            result.listener = partial(self.on_result_changed, message['id'])
+            self.send_ids[result] = message['id']
+            self.ai_widget.send_prompt(message['prompt'], result)
+        elif kind == 'call':
+            callback = partial(self.reply_call, message['id'])
+            if message['method'] == 'highlighted_text':
+                self.ai_widget.get_highlighted_text(callback)
+            elif message['method'] == 'title':
+                self.ai_widget.fetch_title(callback)
+            else:
+                callback(None)
+        elif kind == 'open_url':
+            self.ai_widget.open_url(message['url'])
+        elif kind == 'highlight_color':
+            self.ai_widget.set_highlight_color(message['color'])
+        elif kind == 'self_copy_ack':
+            self.self_copy_acks.add(message['id'])
+        elif kind == 'quit':
+            self.ai_widget.dispose()
+            QApplication.instance().quit()
+
+    def reply_call(self, call_id, value):
+        self.channel.send({'type': 'return', 'id': call_id, 'value': value})
+
+    def on_result_changed(self, send_id, result):
+        self.channel.send({'type': 'result', 'id': send_id, 'state': result.state, 'error': result.error})
+        if result.is_settled():
+            # reply_started 在发送确认之前发出，之后不再需要发送编号
+            self.send_ids.pop(result, None)
+
+    def on_reply_stream_started(self, reply_stream):
+        self.channel.send({'type': 'reply_started', 'token': reply_stream.token, 'prompt': reply_stream.prompt,
+                           'send_id': self.send_ids.get(reply_stream.result)})
+        reply_stream.chunk_received.connect(self.on_reply_chunk)
+        reply_stream.done.connect(
+            lambda stream: self.channel.send({'type': 'reply_done', 'token': stream.token, 'text': stream.text()}))
+
+    def on_reply_chunk(self, reply_stream, text):
+        self.channel.send({'type': 'reply_chunk', 'token': reply_stream.token,
+                           'offset': reply_stream.length - len(text), 'text': text})
+
+    def record_reply(self, ai_widget, reply_stream):
+        # 回复由主进程在收到 reply_done 时写入；这里只更新工作进程中显示的统计
+        self.ai_widget.metrics.record_reply(reply_stream.time_to_first_token(), reply_stream.total_time(),
+                                            len(reply_stream.text()))
+
+    def metrics_for(self, name):
+        # 工作进程重启后统计从数据库中最近的回复恢复
+        metrics = PlatformMetrics(name, self)
+        metrics.load_history(self.store.recent_reply_metrics(name))
+        return metrics
+
+    def record_ack(self, ai_widget, seconds):
+        # 发送确认延迟只有工作进程知道，同时转给主进程的统计
+        ai_widget.metrics.record_ack(seconds)
+        self.channel.send({'type': 'ack_sample', 'seconds': seconds})
+
+    def note_self_copy(self, text):
+        # 剪贴板由主进程记录：先通知主进程，等它确认已登记（最多 1 秒）后调用方再复制，
+        # 否则主进程可能先处理剪贴板变化、后读到这条消息
+        self.self_copy_counter += 1
+        copy_id = self.self_copy_counter
+        self.channel.send({'type': 'self_copy', 'text': text, 'id': copy_id})
+        self.channel.socket.flush()
+        deadline = time.time() + 1
+        while copy_id not in self.self_copy_acks:
+            remaining = int((deadline - time.time()) * 1000)
+            if remaining <= 0 or not self.channel.socket.waitForReadyRead(remaining):
+                print("主进程未确认剪贴板登记")
+                break
+        self.self_copy_acks.discard(copy_id)
+
+    def raise_(self):
+        # 平台窗口嵌入在主窗口中，随主窗口显示
+        pass
+
+    def activateWindow(self):
+        self.ai_widget.activateWindow()
+
+    def save_config(self):
+        # 坐标设置交给主进程保存，避免多个进程同时写 config.json
+        self.channel.send({'type': 'send_method', 'send_method': self.ai_widget.send_method})
+        self.channel.send({'type': 'coordinates',
+                           'coordinates': self.config['platform_coordinates'].get(self.ai_widget.name, {})})
+
+
+def run_pane_worker(argv):
+    index = argv.index('--pane-worker')
+    server_name, key, name, url, window_index, initial_url = argv[index + 1:index + 7]
+    app = QApplication(argv)
+    if PROFILER.enabled:
+        # 每个工作进程写自己的 trace 文件
+        base, ext = os.path.splitext(PROFILER.path)
+        PROFILER.path = f"{base}.pane{window_index}{ext}"
+    worker = PaneWorker(server_name, key, name, url, int(window_index), initial_url)
+    code = app.exec_()
+    PROFILER.write()
+    LOG_WRITER.close()
+    return code
+
+
+class HeadlessJob:
+    # 无界面批量运行中的一次发送：一个提示词在一个平台上的结果
+    def __init__(self, prompt_index, prompt, platform_name):
+        self.prompt_index = prompt_index
+        self.prompt = prompt
+        self.platform_name = platform_name
+        self.status = None
+        self.error = None
+        self.token = None
+        self.result = None
+        self.reply_stream = None
+        self.started_at = time.time()
+
+    def to_record(self):
+        reply_stream = self.reply_stream
+        ack = self.result.elapsed(SendResult.CONFIRMED) if self.result else None
+        return {
+            'prompt_index': self.prompt_index,
+            'prompt': self.prompt,
+            'platform': self.platform_name,
+            'status': self.status,
+            'error': self.error,
+            'reply': reply_stream.text() if reply_stream else '',
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'ack_seconds': round(ack, 3) if ack is not None else None,
+            'ttft_seconds': reply_stream.time_to_first_token() if reply_stream else None,
+            'total_seconds': reply_stream.total_time() if reply_stream else None,
+        }
+
+
+class HeadlessPlatform(QObject):
+    # 无界面的平台：一个不显示的 CustomWebEnginePage，沿用站点适配运行时、SendConfirmation 和
+    # ReplyStream，实现页面回调所需的 handle_* 接口。每个提示词前重新打开平台网址，得到新的对话
+    job_finished = pyqtSignal(object)
+    SETTLE_MS = 1500  # 页面加载完成后等待输入框渲染
+
+    def __init__(self, name, url, profile, timeout_s, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.url = url
+        self.send_method = 'javascript'
+        self.page = CustomWebEnginePage(profile, self, ai_platform=self)
+        self.page.loadFinished.connect(self.on_load_finished)
+        self.job = None
+        self.confirmations = {}
+        self.send_counter = 0
+        self.timeout_timer = QTimer(self)
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.setInterval(int(timeout_s * 1000))
+        self.timeout_timer.timeout.connect(lambda: self.finish('timeout', "等待回复超时"))
+
+    def run(self, job):
+        self.job = job
+        self.timeout_timer.start()
+        self.page.load(QUrl(self.url))
+
+    def on_load_finished(self, ok):
+        if self.job is None or self.job.token is not None:
+            return
+        if not ok:
+            self.finish('failed', "页面加载失败")
+            return
+        QTimer.singleShot(self.SETTLE_MS, self.send_current)
+
+    def send_current(self):
+        job = self.job
+        if job is None or job.token is not None:
+            return
+        self.send_counter += 1
+        job.token = f"headless-{self.name}-{self.send_counter}-{int(time.time() * 1000)}"
+        job.result = SendResult(self.name, job.prompt, self.send_method)
+        job.reply_stream = ReplyStream(self.name, job.prompt, job.token, self)
+        confirmation = SendConfirmation(self, job.prompt, job.result, job.token)
+        self.confirmations[job.token] = confirmation
+        self.resend(confirmation)
+        confirmation.start()
+
+    def resend(self, confirmation):
+        call_js = f"window.__supperai.send({json.dumps(confirmation.prompt)}, {json.dumps(confirmation.token)})"
+
+        def callback(js_result):
+            if js_result == 'not_installed':
+                self.page.runJavaScript(SITE_ADAPTERS.runtime_script() + call_js, callback)
+            elif js_result == 'success':
+                confirmation.result.mark(SendResult.INJECTED)
+            elif not confirmation.result.is_settled():
+                confirmation.fail(str(js_result))
+
+        self.page.runJavaScript(f"window.__supperai ? {call_js} : 'not_installed';", callback)
+
+    def query_send_state(self, token, callback):
+        js_code = f"window.__supperai ? window.__supperai.sendState({json.dumps(token)}) : null;"
+        self.page.runJavaScript(js_code, callback)
+
+    def finish_confirmation(self, confirmation):
+        self.confirmations.pop(confirmation.token, None)
+        confirmation.deleteLater()
+        if not self.job or self.job.token != confirmation.token:
+            return
+        if confirmation.result.state == SendResult.FAILED:
+            self.finish('failed', confirmation.result.error)
+        elif not SITE_ADAPTERS.adapter_for(QUrl(self.url).host()).watches_reply():
+            # 站点不回传回复，发送确认即完成
+            self.finish('ok')
+
+    def handle_send_ack(self, payload):
+        confirmation = self.confirmations.get(payload.get('token'))
+        if confirmation:
+            confirmation.acknowledge()
+
+    def handle_reply_chunk(self, token, offset, text):
+        if self.job and self.job.token == token:
+            self.job.reply_stream.apply_chunk(offset, text)
+
+    def handle_reply_done(self, token, text):
+        if self.job and self.job.token == token:
+            self.job.reply_stream.finish(text)
+            self.finish('ok')
+
+    def handle_ai_reply(self, reply_content):
+        # 旧版控制台回复通道，批量运行中不使用
+        pass
+
+    def handle_highlights_anchored(self, highlight_ids):
+        pass
+
+    def finish(self, status, error=None):
+        job = self.job
+        if job is None:
+            return
+        self.job = None
+        self.timeout_timer.stop()
+        for confirmation in list(self.confirmations.values()):
+            confirmation.timer.stop()
+            confirmation.deleteLater()
+        self.confirmations.clear()
+        job.status = status
+        job.error = error
+        self.job_finished.emit(job)
+
+
+class HeadlessRunner(QObject):
+    # 批量运行：concurrency 条通道，每条通道为每个平台保留一个页面，依次取提示词同时发给所有平台，
+    # 全部平台完成（或超时）后取下一个。每条结果立即追加到 JSONL 文件，中断后重新运行会跳过已成功的记录
+    def __init__(self, prompts, platforms, out_path, concurrency, timeout_s, parent=None):
+        super().__init__(parent)
+        self.out_path = out_path
+        self.profile_manager = ProfileManager()
+        done = self.load_finished_records(out_path)
+        self.queue = deque((i, p) for i, p in enumerate(prompts)
+                           if any((i, platform['name']) not in done for platform in platforms))
+        self.done = done
+        self.total = len(self.queue)
+        self.completed = 0
+        self.counts = {}
+        self.started_at = time.time()
+        self.out_file = open(out_path, 'a', encoding='utf-8')
+        self.lanes = []
+        for _ in range(max(1, concurrency)):
+            lane = {'platforms': [], 'pending': 0}
+            for platform in platforms:
+                headless = HeadlessPlatform(platform['name'], platform['url'],
+                                            self.profile_manager.get_profile(QUrl(platform['url']).host()),
+                                            timeout_s, self)
+                headless.job_finished.connect(partial(self.on_job_finished, lane))
+                lane['platforms'].append(headless)
+            self.lanes.append(lane)
+        self.active_lanes = len(self.lanes)
+
+    @staticmethod
+    def load_finished_records(out_path):
+        done = set()
+        if not os.path.exists(out_path):
+            return done
+        with open(out_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'ok':
+                    done.add((record['prompt_index'], record['platform']))
+        return done
+
+    def start(self):
+        print(f"[headless] 共 {self.total} 个提示词，{len(self.lanes)} 条并发通道")
+        for lane in self.lanes:
+            self.next_prompt(lane)
+
+    def next_prompt(self, lane):
+        if not self.queue:
+            self.active_lanes -= 1
+            if self.active_lanes == 0:
+                self.finish()
+            return
+        index, prompt = self.queue.popleft()
+        for headless in lane['platforms']:
+            if (index, headless.name) in self.done:
+                continue
+            lane['pending'] += 1
+            headless.run(HeadlessJob(index, prompt, headless.name))
+        if lane['pending'] == 0:
+            self.next_prompt(lane)
+
+    def on_job_finished(self, lane, job):
+        self.out_file.write(json.dumps(job.to_record(), ensure_ascii=False) + '\n')
+        self.out_file.flush()
+        self.counts[job.status] = self.counts.get(job.status, 0) + 1
+        lane['pending'] -= 1
+        if lane['pending'] == 0:
+            self.completed += 1
+            print(f"[headless] 已完成 {self.completed}/{self.total} {self.counts}")
+            self.next_prompt(lane)
+
+    def finish(self):
+        self.out_file.close()
+        print(f"[headless] 全部完成，用时 {time.time() - self.started_at:.0f} 秒，结果 {self.counts}，写入 {self.out_path}")
+        QApplication.instance().quit()
+
+
+def read_prompt_file(path):
+    # 每行一个提示词；以 { 开头的行按 JSON 读取其中的 prompt 字段
+    prompts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    line = json.loads(line).get('prompt', '')
+                except ValueError:
+                    pass
+            if line:
+                prompts.append(line)
+    return prompts
+
+
+def run_headless(argv):
+    parser = argparse.ArgumentParser(description='SupperAI+ 无界面批量发送')
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--prompts', required=True, help='提示词文件，每行一个（或 JSONL 的 prompt 字段）')
+    parser.add_argument('--out', default='headless_results.jsonl', help='结果 JSONL 文件')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发通道数，每条通道为每个平台打开一个页面')
+    parser.add_argument('--platforms', default='', help='逗号分隔的平台名，默认使用 config.json 中显示的平台')
+    parser.add_argument('--timeout', type=float, default=300, help='单个平台等待回复的秒数')
+    args, qt_args = parser.parse_known_args(argv[1:])
+    # 不需要显示任何窗口
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication([argv[0]] + qt_args)
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if args.platforms:
+        names = [name.strip() for name in args.platforms.split(',')]
+        platforms = [p for p in config['ai_platforms'] if p['name'] in names]
+    else:
+        platforms = config['ai_platforms'][:config.get('num_platforms', len(config['ai_platforms']))]
+    # 使用保存的网址（与界面中的平台窗口一致）
+    coordinates = config.get('platform_coordinates', {})
+    platforms = [dict(p, url=coordinates.get(p['name'], {}).get('url', p['url'])) for p in platforms]
+    runner = HeadlessRunner(read_prompt_file(args.prompts), platforms, args.out, args.concurrency, args.timeout)
+    QTimer.singleShot(0, runner.start)
+    code = app.exec_()
+    LOG_WRITER.close()
+    return code
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.load_config()
+        with PROFILER.span('config_load'):
+            self.load_config()
+        with PROFILER.span('history_load'):
+            self.store = PromptStore('supperai.db')
+            self.store.import_legacy_files()
+            self.highlights = HighlightIndex(self.store)
         self.initUI()
 
     def load_config(self):
-        if not os.path.exists('config.json'):
-            self.config = {
-                "num_platforms": 4,
-                "ai_platforms": [
-                    {"name": "ChatGPT", "url": "https://chatgpt.com/"},
-                    {"name": "元宝", "url": "https://yuanbao.tencent.com/"},
-                    {"name": "豆包", "url": "https://www.doubao.com/"},
-                    {"name": "Kimi", "url": "https://kimi.moonshot.cn/"}
+        self.config_store = ConfigStore('config.json', self)
+        self.config = self.config_store.load({
+            "num_platforms": 4,
+            "ai_platforms": [
+                {"name": "ChatGPT", "url": "https://chatgpt.com/"},
+                {"name": "元宝", "url": "https://yuanbao.tencent.com/"},
+                {"name": "豆包", "url": "https://www.doubao.com/"},
+                {"name": "Kimi", "url": "https://kimi.moonshot.cn/"}
+            ],
+            "common_urls": {
+                "ChatGPT": [
+                    {"name": "ChatGPT", "url": "https://chatgpt.com/"}
                 ],
-                "common_urls": {
-                    "ChatGPT": [
-                        {"name": "ChatGPT", "url": "https://chatgpt.com/"}
-                    ],
-                    "ChatGLM": [
-                        {"name": "ChatGLM", "url": "https://chatglm.cn/"}
-                    ],
-                    "腾讯": [
-                        {"name": "元宝", "url": "https://yuanbao.tencent.com/"}
-                    ],
-                    "豆包": [
-                        {"name": "豆包", "url": "https://www.doubao.com/"}
-                    ],
-                    "Kimi": [
-                        {"name": "Kimi", "url": "https://kimi.moonshot.cn/"}
-                    ]
-                },
-                "platform_coordinates": {},
-                "window_geometry": None,
-                "window_state": None,
-                "prompt_manager_docked": True,  # Default docked
-                "default_open_area": "ai_browser",  # 默认打开区域
-                "right_tab_order": ["历史提示词", "收藏提示词", "历史对话", "常用AI"]
-            }
-            # 保存默认配置
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-        else:
-            with open('config.json', 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-                # 确保 "ChatGPT" 在配置中
-                if not any(p['name'] == 'ChatGPT' for p in self.config['ai_platforms']):
-                    self.config['ai_platforms'].insert(0, {"name": "ChatGPT", "url": "https://chatgpt.com/"})
-                if 'ChatGPT' not in self.config['common_urls']:
-                    self.config['common_urls']['ChatGPT'] = [{"name": "ChatGPT", "url": "https://chatgpt.com/"}]
+                "ChatGLM": [
+                    {"name": "ChatGLM", "url": "https://chatglm.cn/"}
+                ],
+                "腾讯": [
+                    {"name": "元宝", "url": "https://yuanbao.tencent.com/"}
+                ],
+                "豆包": [
+                    {"name": "豆包", "url": "https://www.doubao.com/"}
+                ],
+                "Kimi": [
+                    {"name": "Kimi", "url": "https://kimi.moonshot.cn/"}
+                ]
+            },
+            "platform_coordinates": {},
+            "window_geometry": None,
+            "window_state": None,
+            "prompt_manager_docked": True,  # Default docked
+            "default_open_area": "ai_browser",  # 默认打开区域
+            "right_tab_order": ["历史提示词", "收藏提示词", "历史对话", "常用AI"]
+        })
+        # 确保 "ChatGPT" 在配置中
+        if not any(p['name'] == 'ChatGPT' for p in self.config['ai_platforms']):
+            self.config['ai_platforms'].insert(0, {"name": "ChatGPT", "url": "https://chatgpt.com/"})
+            self.save_config()
+        if 'ChatGPT' not in self.config['common_urls']:
+            self.config['common_urls']['ChatGPT'] = [{"name": "ChatGPT", "url": "https://chatgpt.com/"}]
+            self.save_config()
         # 默认数量
         self.num_platforms = self.config.get('num_platforms', len(self.config['ai_platforms']))
 
@@ -1809,6 +5590,12 @@ class MainWindow(QMainWindow):
 
         self.main_splitter.addWidget(self.ai_platform_container)
 
+        # 浏览器窗口在窗口显示后逐个创建
+        self.startup = StartupScheduler(self)
+        # 不可见的页面按内存预算冻结或释放
+        self.lifecycle = PageLifecycleManager(self.config.get('page_freeze_after_s', 300),
+                                              self.config.get('memory_budget_mb', 3000), self)
+
         # 创建提示词管理器
         self.prompt_manager = PromptManager(self)
         self.main_splitter.addWidget(self.prompt_manager)
@@ -1826,7 +5613,22 @@ class MainWindow(QMainWindow):
         # 创建菜单
         self.create_menus()
 
-        self.profile_manager = ProfileManager()
+        self.profile_manager = ProfileManager(self.config.get('profile_cache'))
+        self.metrics = {}  # 平台名 -> PlatformMetrics
+        # 回复对比面板从启动起就收集回复，打开时即可看到最近一轮
+        self.comparison_panel = ReplyComparisonPanel(self)
+        # 多进程模式：每个平台窗口运行在独立进程中，由 --isolated-panes 参数或 pane_isolation 配置开启
+        self.pane_isolation = self.config.get('pane_isolation', False) or '--isolated-panes' in sys.argv
+        self.pane_hub = PaneProcessHub(self) if self.pane_isolation else None
+        # 先为各平台预热缓存，再依次创建平台窗口（多进程模式下由各工作进程自行预热）
+        if not self.pane_isolation:
+            for platform in self.config['ai_platforms'][:self.num_platforms]:
+                domain = QUrl(platform['url']).host()
+                self.startup.schedule(partial(self.profile_manager.warm_up, domain), priority=-1, group='warmup')
+        self.dispatcher = BroadcastDispatcher(self)
+        self.dispatcher.broadcast_started.connect(self.comparison_panel.start_round)
+        self.platform_pool = PlatformWidgetPool(self.config.get('platform_pool_spare', 6))
+        self.ai_platform_widgets = []
         self.create_ai_platforms()
 
         # 恢复窗口几何和状态
@@ -1862,21 +5664,15 @@ class MainWindow(QMainWindow):
         print(f"划线颜色已切换为 {self.current_highlight_color}")
 
     def copy_highlights_to_prompt(self):
-        all_highlighted_texts = []
-        remaining_callbacks = len(self.ai_platform_widgets)
+        # 本进程的窗口直接查划线索引；独立进程的窗口经进程间调用返回，超时的窗口跳过
+        def on_finished(results):
+            texts = [f"{r.name}：{r.value}" for r in results if r.state == GatherResult.OK and r.value]
+            self.prompt_manager.set_current_prompt('\n'.join(texts))
 
-        def collect_text(text, name):
-            nonlocal remaining_callbacks
-            if text:
-                all_highlighted_texts.append(f"{name}：{text}")
-            remaining_callbacks -= 1
-            if remaining_callbacks == 0:
-                # 所有回调函数均已返回
-                combined_text = '\n'.join(all_highlighted_texts)
-                self.prompt_manager.set_current_prompt(combined_text)
-
-        for ai_widget in self.ai_platform_widgets:
-            ai_widget.get_highlighted_text(partial(collect_text, name=ai_widget.name))
+        gather = ScatterGather(self.ai_platform_widgets, lambda w, cb: w.get_highlighted_text(cb),
+                               timeout_ms=2000, label='collect_highlights', parent=self)
+        gather.finished.connect(on_finished)
+        gather.start()
 
     def create_menus(self):
         menubar = self.menuBar()
@@ -1900,6 +5696,27 @@ class MainWindow(QMainWindow):
             platform_number_menu.addAction(action)
         view_menu.addMenu(platform_number_menu)
 
+        comparison_action = QAction("回复对比", self)
+        comparison_action.setShortcut(QKeySequence('Ctrl+Shift+D'))
+        comparison_action.triggered.connect(self.show_comparison_panel)
+        view_menu.addAction(comparison_action)
+
+        cache_usage_action = QAction("浏览器缓存占用", self)
+        cache_usage_action.triggered.connect(self.show_cache_usage)
+        view_menu.addAction(cache_usage_action)
+
+    def show_comparison_panel(self):
+        self.comparison_panel.show()
+        self.comparison_panel.raise_()
+        self.comparison_panel.activateWindow()
+
+    def show_cache_usage(self):
+        usage = self.profile_manager.disk_usage()
+        lines = [f"{name}：{size / (1024 * 1024):.1f} MB" for name, size in usage.items()]
+        total = sum(usage.values()) / (1024 * 1024)
+        lines.append(f"合计：{total:.1f} MB")
+        QMessageBox.information(self, "浏览器缓存占用", '\n'.join(lines))
+
     def change_num_platforms(self):
         action = self.sender()
         if action and action.data():
@@ -1910,6 +5727,7 @@ class MainWindow(QMainWindow):
             # 重新创建 AI 平台窗口
             self.create_ai_platforms()
             self.config["num_platforms"] = self.num_platforms
+            self.save_config()
 
     def toggle_dock_prompt_manager(self, checked):
         if checked:
@@ -1918,6 +5736,7 @@ class MainWindow(QMainWindow):
             self.main_splitter.setStretchFactor(0, 8)
             self.main_splitter.setStretchFactor(1, 2)
             self.config["prompt_manager_docked"] = True
+            self.save_config()
             # 设置初始尺寸
             QTimer.singleShot(0, self.set_initial_splitter_sizes)
         else:
@@ -1936,6 +5755,7 @@ class MainWindow(QMainWindow):
             y = (screen_geometry.height() - height) / 2
             self.prompt_manager.setGeometry(int(x), int(y), int(width), int(height))
             self.config["prompt_manager_docked"] = False
+            self.save_config()
 
     def set_initial_splitter_sizes(self):
         total_height = self.main_splitter.height()
@@ -1952,53 +5772,112 @@ class MainWindow(QMainWindow):
             prompt_height = total_height - ai_height
             self.main_splitter.setSizes([ai_height, prompt_height])
 
-    def create_ai_platforms(self):
-        # 清除现有的 AI 平台窗口
-        for i in reversed(range(self.ai_platform_layout.count())):
-            widget = self.ai_platform_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.setParent(None)
+    def create_ai_platforms(self, urls=None):
+        # 取消尚未执行的创建任务；已有的窗口从池中取回，只有池中没有的平台才新建。
+        # 已创建窗口的页面加载任务在单独的分组中，不随之取消，否则这些窗口会一直停在空白页
+        self.startup.cancel('ai_platforms')
+        platforms_to_create = self.config['ai_platforms'][:self.num_platforms]
+        keys = []
+        for platform in platforms_to_create:
+            # 同名平台出现多次时按出现次数区分
+            keys.append((platform['name'], sum(1 for key in keys if key[0] == platform['name'])))
+        self.platform_pool.release_except(keys)
         self.ai_platform_widgets = []
 
-        # 创建新的 AI 平台窗口
-        platforms_to_create = self.config['ai_platforms'][:self.num_platforms]
-        for idx, platform in enumerate(platforms_to_create):
-            window_index = idx + 1  # Start index from 1
-            ai_widget = AIPlatform(
-                platform['name'],
-                platform['url'],
-                self.profile_manager,
-                self.config.get('common_urls', {}),
-                window_index,
-                self.config,
-                self
-            )
-            ai_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-            # 设置初始划线颜色
-            ai_widget.set_highlight_color(self.current_highlight_color)
+        # 新窗口的创建和页面加载各占一次事件循环，从左到右依次进行
+        for idx, (platform, key) in enumerate(zip(platforms_to_create, keys)):
+            initial_url = urls[idx] if urls and idx < len(urls) else None
+            ai_widget = self.platform_pool.acquire(key)
+            if ai_widget is None:
+                self.startup.schedule(partial(self.create_ai_platform, idx, key, platform, initial_url),
+                                      priority=idx, group='ai_platforms')
+                continue
+            ai_widget.window_index = idx + 1
+            if initial_url and ai_widget.current_url() != initial_url:
+                ai_widget.open_url(initial_url)
             self.ai_platform_widgets.append(ai_widget)
+        self.arrange_ai_platforms()
+
+    def arrange_ai_platforms(self):
+        # 按窗口索引重新排列布局，备用窗口保持隐藏
+        self.ai_platform_widgets.sort(key=lambda w: w.window_index)
+        for i in reversed(range(self.ai_platform_layout.count())):
+            self.ai_platform_layout.takeAt(i)
+        for ai_widget in self.ai_platform_widgets:
             self.ai_platform_layout.addWidget(ai_widget)
+            ai_widget.show()
         # 浏览器的宽度按整体窗口宽度总是平均分配
         for i in range(len(self.ai_platform_widgets)):
             self.ai_platform_layout.setStretch(i, 1)
 
+    def create_ai_platform(self, idx, key, platform, initial_url):
+        window_index = idx + 1  # Start index from 1
+        with PROFILER.span('ai_platform_init', platform=platform['name']):
+            if self.pane_isolation:
+                ai_widget = RemotePlatform(f"{key[0]}#{key[1]}", platform['name'], platform['url'], window_index,
+                                           self, initial_url=initial_url)
+            else:
+                ai_widget = AIPlatform(
+                    platform['name'],
+                    platform['url'],
+                    self.profile_manager,
+                    self.config.get('common_urls', {}),
+                    window_index,
+                    self.config,
+                    self,
+                    initial_url=initial_url
+                )
+        ai_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # 设置初始划线颜色
+        ai_widget.set_highlight_color(self.current_highlight_color)
+        self.platform_pool.add(key, ai_widget)
+        ai_widget.reply_stream_started.connect(self.comparison_panel.add_stream)
+        self.ai_platform_widgets.append(ai_widget)
+        self.arrange_ai_platforms()
+        if not self.pane_isolation:
+            # 独立进程中的页面由工作进程自己加载和管理
+            self.lifecycle.register(ai_widget.browser, ai_widget.name, ai_widget.is_busy)
+            self.startup.schedule(ai_widget.start_loading, priority=idx, group='page_loading')
+
+    def note_self_copy(self, text):
+        # 程序即将写入剪贴板的内容，剪贴板记录中忽略
+        self.prompt_manager.clipboard_ring.suppress(text)
+
+    def metrics_for(self, name):
+        # 各平台的统计在窗口重建后保留，首次创建时载入数据库中最近的回复耗时
+        if name not in self.metrics:
+            self.metrics[name] = PlatformMetrics(name, self)
+            self.metrics[name].load_history(self.store.recent_reply_metrics(name))
+        return self.metrics[name]
+
+    def record_ack(self, ai_widget, seconds):
+        self.metrics_for(ai_widget.name).record_ack(seconds)
+
+    def record_reply(self, ai_widget, reply_stream):
+        # 平台回复完成：写回复日志、更新统计并存入数据库
+        ai_widget.handle_ai_reply(reply_stream.text())
+        self.metrics_for(ai_widget.name).record_reply(reply_stream.time_to_first_token(), reply_stream.total_time(),
+                                                      len(reply_stream.text()))
+        self.store.add_reply(reply_stream.prompt, ai_widget.name, reply_stream.text(),
+                             time.strftime("%Y-%m-%d %H:%M:%S"),
+                             reply_stream.time_to_first_token(), reply_stream.total_time())
+
+    def save_config(self):
+        # 合并短时间内的多次修改，由 ConfigStore 稍后写盘
+        self.config_store.mark_dirty()
+
     def load_chat_history(self, chat):
         urls = chat['urls']
         num_urls = len(urls)
         self.num_platforms = num_urls
-        self.create_ai_platforms()
-        for idx, ai_widget in enumerate(self.ai_platform_widgets):
-            ai_widget.url = urls[idx]
-            ai_widget.address_bar.setText(ai_widget.url)
-            ai_widget.browser.load(QUrl(ai_widget.url))
+        self.create_ai_platforms(urls)
 
     def send_prompt_to_all(self, prompt):
         self.current_prompt = prompt  # Save current prompt for checking
-        for ai_widget in self.ai_platform_widgets:
-            ai_widget.send_prompt(prompt)
+        broadcast = self.dispatcher.dispatch(prompt, self.ai_platform_widgets)
         # Record the sent prompt
-        with open('prompt_send.log', 'a', encoding='utf-8') as f:
-            f.write(f'发送提示词：{prompt}\n')
+        LOG_WRITER.write('prompt_send.log', f'发送提示词：{prompt}\n')
+        return broadcast
 
     def closeEvent(self, event):
         # Save prompt manager docked state
@@ -2007,12 +5886,28 @@ class MainWindow(QMainWindow):
         self.config["window_geometry"] = self.saveGeometry().toHex().data().decode()
         self.config["window_state"] = self.saveState().toHex().data().decode()
         # Save platform coordinates are handled in AIPlatform.save_coordinates()
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=4, ensure_ascii=False)
+        self.config_store.mark_dirty()
+        self.config_store.flush()
+        self.profile_manager.save_warmup_lists()
+        # 结束多进程模式下的各平台工作进程
+        for ai_widget in list(self.platform_pool.active.values()) + list(self.platform_pool.spare.values()):
+            if getattr(ai_widget, 'is_remote', False):
+                ai_widget.dispose()
+        # 把尚未写盘的日志全部写完
+        LOG_WRITER.close()
+        PROFILER.write()
+        self.store.close()
         super().closeEvent(event)
 
 
 if __name__ == '__main__':
+    PROFILER.configure(sys.argv, os.environ)
+    if '--pane-worker' in sys.argv:
+        # 多进程模式下由主进程启动的平台窗口进程
+        sys.exit(run_pane_worker(sys.argv))
+    if '--headless' in sys.argv:
+        # 无界面批量运行：python "SupperAI+4.2.py" --headless --prompts prompts.txt --out results.jsonl
+        sys.exit(run_headless(sys.argv))
     app = QApplication(sys.argv)
     # Set application icon
     if os.path.exists('icon.png'):
@@ -2028,4 +5923,5 @@ if __name__ == '__main__':
 
     window = MainWindow()
     window.show()
+    PROFILER.instant('window_shown')
     sys.exit(app.exec_())